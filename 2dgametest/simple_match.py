@@ -6,7 +6,7 @@ Changes vs your version:
 - Uses OpenCV matchTemplate on numpy arrays (much faster)
 - One screenshot per frame shared across all templates
 - Per-template ROI heuristic (search around last_pos), fallback to full-frame
-- Optional thread pool (OpenCV often releases the GIL, so threads can help)
+- Optional persistent worker threads (OpenCV often releases the GIL, so threads can help)
 
 Notes:
 - Confidence threshold is applied to matchTemplate score (TM_CCOEFF_NORMED by default)
@@ -18,25 +18,102 @@ from __future__ import annotations
 import os
 import time
 import glob
-from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union, Dict
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple, Union, Dict
 
 import cv2 as cv
 import numpy as np
 import mss
 
+try:
+    import dxcam  # Windows Desktop Duplication capture (optional, faster than mss)
+except ImportError:
+    dxcam = None
 
-@dataclass
-class MatchResult:
-    id: int
-    found: bool
-    x: int
-    y: int
-    w: int
-    h: int
-    score: float
-    method: str  # "Heuristic" or "Full Scan" or "Not Found"
+
+# Search window padding (pixels, per side) when refining a coarse hit at each intermediate pyramid level
+_PYR_CASCADE_MARGIN = 4
+
+# Coarse/full-scan correlation switches to the frequency domain once both template sides reach
+# this size; below it a direct uint8 TM_CCORR is cheaper than the per-template inverse DFT.
+_DFT_MIN_TEMPLATE_SIDE = 18
+
+
+def _crop_array(img: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
+    return img[y : y + h, x : x + w]
+
+
+def _crop_umat(img: "cv.UMat", x: int, y: int, w: int, h: int) -> "cv.UMat":
+    return cv.UMat(img, (y, y + h), (x, x + w))
+
+
+def _argmax_2d(res: np.ndarray) -> Tuple[float, int, int]:
+    """(max_value, x, y) of a 2D score map: a single max scan instead of minMaxLoc's min+max."""
+    idx = int(res.argmax())
+    y, x = divmod(idx, res.shape[1])
+    return float(res.flat[idx]), x, y
+
+
+# Match method codes stored in the results array
+METHOD_NOT_FOUND = 0
+METHOD_HEURISTIC = 1
+METHOD_PYRAMID = 2
+METHOD_FULL_SCAN = 3
+METHOD_NAMES = ("Not Found", "Heuristic", "Pyramid", "Full Scan")
+
+# One row per template, rewritten in place every frame
+RESULT_DTYPE = np.dtype([
+    ("found", "?"), ("x", "i4"), ("y", "i4"), ("w", "i4"), ("h", "i4"),
+    ("score", "f4"), ("method", "u1"),
+])
+
+
+class MatchResultView:
+    """
+    Attribute access to one row of the tracker's results array.
+
+    Views are created once per template and reused: their values change on the
+    next find_all(), so read (or copy) what you need before calling it again.
+    """
+    __slots__ = ("id", "_results")
+
+    def __init__(self, results: np.ndarray, idx: int):
+        self.id = idx
+        self._results = results
+
+    @property
+    def found(self) -> bool:
+        return bool(self._results["found"][self.id])
+
+    @property
+    def x(self) -> int:
+        return int(self._results["x"][self.id])
+
+    @property
+    def y(self) -> int:
+        return int(self._results["y"][self.id])
+
+    @property
+    def w(self) -> int:
+        return int(self._results["w"][self.id])
+
+    @property
+    def h(self) -> int:
+        return int(self._results["h"][self.id])
+
+    @property
+    def score(self) -> float:
+        return float(self._results["score"][self.id])
+
+    @property
+    def method_code(self) -> int:
+        return int(self._results["method"][self.id])
+
+    @property
+    def method(self) -> str:
+        """Method name: Heuristic, Pyramid, Full Scan or Not Found."""
+        return METHOD_NAMES[self._results["method"][self.id]]
 
 
 @dataclass
@@ -50,8 +127,22 @@ class TemplateState:
     h: int
     w_small: int             # downscaled width
     h_small: int             # downscaled height
-    last_pos: Optional[Tuple[int, int]] = None
-    found: bool = False
+    # Template pyramid matching the frame pyramid: [full-res, small, pyrDown(small), ...].
+    # The coarse search runs at tpl_pyr[top_level]; finer levels refine around its hit.
+    tpl_pyr: List[np.ndarray] = field(default_factory=list, repr=False)
+    u_tpl_pyr: List["cv.UMat"] = field(default_factory=list, repr=False)  # tpl_pyr uploaded once (use_opencl)
+    top_level: int = 1
+    tpl_coarse_zm: Optional[np.ndarray] = None  # zero-mean float32 top-level template (coarse CCORR path)
+    tpl_coarse_norm: float = 0.0                # sum of squares of tpl_coarse_zm
+    tpl_coarse_fft: Optional[np.ndarray] = None # spectrum of tpl_coarse_zm padded to the top-level DFT size
+    tpl_coarse_mean: float = 0.0                # top-level template mean (small templates: uint8 CCORR path)
+    tpl_full_zm: Optional[np.ndarray] = None    # same three for the full-res template (DFT full scan)
+    tpl_full_norm: float = 0.0
+    tpl_full_fft: Optional[np.ndarray] = field(default=None, repr=False)
+    # Pre-allocated matchTemplate outputs (passed as result=, reallocated by OpenCV only on ROI clipping)
+    res_buf_coarse: Optional[np.ndarray] = field(default=None, repr=False)
+    res_buf_roi: Optional[np.ndarray] = field(default=None, repr=False)
+    res_buf_refine: Optional[np.ndarray] = field(default=None, repr=False)
 
 
 class MultiTemplateTrackerCV:
@@ -65,26 +156,98 @@ class MultiTemplateTrackerCV:
         use_grayscale: bool = True,
         downscale_factor: float = 0.5,  # NEW: downscale for faster matching
         skip_full_scan: bool = True,    # Skip full-res fallback when pyramid enabled
+        pyramid_min_side: int = 200,    # Keep halving the small frame while its short side exceeds this
+        min_template_side: int = 16,    # Coarsest template level must keep at least this many pixels per side
+        use_opencl: bool = False,       # Run matchTemplate through OpenCV's T-API (UMat -> OpenCL device)
+        refresh_every_n: int = 30,      # Every N frames skip the ROI heuristic and re-acquire via pyramid (0 = never)
+        pin_workers: bool = False,      # Pin each worker thread to one CPU (Linux only; ignored elsewhere)
     ):
         if isinstance(template_paths, str):
             template_paths = [template_paths]
 
         self.confidence = float(confidence)
+        self._coarse_confidence = self.confidence * 0.9  # Lower threshold for coarse search (verified at full res)
         self.search_margin = int(search_margin)
+        self.refresh_every_n = max(0, int(refresh_every_n))
+        self._frame_idx = 0
         self.method = method
+        self.use_opencl = bool(use_opencl) and cv.ocl.haveOpenCL()
+        if use_opencl and not self.use_opencl:
+            print("[MultiTemplateTrackerCV] OpenCL not available, matching on CPU")
+        cv.ocl.setUseOpenCL(self.use_opencl)
+        self._best_match = self._make_best_match(method, self.use_opencl)
+        self._crop = _crop_umat if self.use_opencl else _crop_array
         self.use_grayscale = use_grayscale
         self.downscale_factor = float(downscale_factor)
         self.use_pyramid = downscale_factor < 1.0
         self.skip_full_scan = skip_full_scan and self.use_pyramid  # Only skip if pyramid is on
+        self._refine_margin = max(20, int(50 / self.downscale_factor))
+        self.pyramid_min_side = int(pyramid_min_side)
+        self.min_template_side = int(min_template_side)
+        # 0.5 / 0.25 are served by 1 / 2 cv.pyrDown passes (fixed 5x5 Gaussian + 2x decimation,
+        # SIMD-optimized and cheaper than a generic resize). Templates use the same filter family.
+        self._pyrdown_steps = {0.5: 1, 0.25: 2}.get(self.downscale_factor, 0)
+        self._use_pyrdown = self._pyrdown_steps > 0
+        # Other clean 1/N factors: nearest-neighbour downscale == stride slicing (reads only kept pixels)
+        step = int(round(1.0 / self.downscale_factor)) if self.use_pyramid else 0
+        self._decimate_step = step if (not self._use_pyrdown and step > 1
+                                       and abs(step * self.downscale_factor - 1.0) < 1e-9) else 0
+        # Coarse pass computes CCOEFF_NORMED as plain TM_CCORR against a zero-mean template,
+        # normalized with integral images shared by all templates in the frame. With OpenCL
+        # the device's CCOEFF_NORMED kernel is used for the coarse pass instead.
+        self._fast_coarse = (self.use_pyramid and self.use_grayscale and method == cv.TM_CCOEFF_NORMED
+                             and not self.use_opencl)
+        # Full scan of large templates: same scheme at level 0, with the frame spectrum computed
+        # at most once per frame (lazily, on the first template that falls through to it)
+        self._fft_full_scan = (not self.skip_full_scan and self.use_grayscale
+                               and method == cv.TM_CCOEFF_NORMED and not self.use_opencl)
 
         self.sct = mss.mss()
         self.monitor = self.sct.monitors[1]
         self.screen_w = int(self.monitor["width"])
         self.screen_h = int(self.monitor["height"])
+
+        # Prefer DXGI Desktop Duplication (dxcam): it hands back a BGRA numpy frame without
+        # per-frame GDI/ScreenShot allocations. mss stays as the portable fallback.
+        self._cam = None
+        self._cam_frame: Optional[np.ndarray] = None
+        if dxcam is not None:
+            try:
+                cam = dxcam.create(output_color="BGRA")
+                if cam is not None and (cam.width, cam.height) == (self.screen_w, self.screen_h):
+                    self._cam = cam
+                elif cam is not None:
+                    cam.release()
+            except Exception as e:
+                print(f"[MultiTemplateTrackerCV] dxcam unavailable ({e}), using mss")
         
-        # Pre-compute downscaled screen dimensions
-        self.screen_w_small = int(self.screen_w * self.downscale_factor)
-        self.screen_h_small = int(self.screen_h * self.downscale_factor)
+        # Pre-compute downscaled screen dimensions (pyrDown rounds up)
+        if self._use_pyrdown:
+            self.screen_w_small, self.screen_h_small = self.screen_w, self.screen_h
+            for _ in range(self._pyrdown_steps):
+                self.screen_w_small = (self.screen_w_small + 1) // 2
+                self.screen_h_small = (self.screen_h_small + 1) // 2
+        elif self._decimate_step:
+            self.screen_w_small = -(-self.screen_w // self._decimate_step)
+            self.screen_h_small = -(-self.screen_h // self._decimate_step)
+        else:
+            self.screen_w_small = int(self.screen_w * self.downscale_factor)
+            self.screen_h_small = int(self.screen_h * self.downscale_factor)
+        self._screen_wh = np.array([self.screen_w, self.screen_h], np.int32)
+        # Full-res match frame, rewritten in place every frame (only read within find_all)
+        self._to_match = cv.COLOR_BGRA2GRAY if self.use_grayscale else cv.COLOR_BGRA2BGR
+        self._frame_buf = np.empty((self.screen_h, self.screen_w) if self.use_grayscale
+                                   else (self.screen_h, self.screen_w, 3), np.uint8)
+
+        # Frame pyramid sizes (w, h): level 0 = full res, level 1 = small, then pyrDown
+        # halvings while the short side stays above pyramid_min_side.
+        self._level_sizes: List[Tuple[int, int]] = [(self.screen_w, self.screen_h)]
+        if self.use_pyramid:
+            self._level_sizes.append((self.screen_w_small, self.screen_h_small))
+            while min(self._level_sizes[-1]) > self.pyramid_min_side:
+                lw, lh = self._level_sizes[-1]
+                self._level_sizes.append(((lw + 1) // 2, (lh + 1) // 2))
+        self._dft_pads: Dict[int, np.ndarray] = {}
 
         self.templates: List[TemplateState] = []
         for i, path in enumerate(template_paths):
@@ -95,196 +258,502 @@ class MultiTemplateTrackerCV:
             tpl_gray = cv.cvtColor(tpl, cv.COLOR_BGR2GRAY)
             
             # Pre-compute downscaled template
-            w_small = max(1, int(w * self.downscale_factor))
-            h_small = max(1, int(h * self.downscale_factor))
-            if self.use_grayscale:
-                tpl_small = cv.resize(tpl_gray, (w_small, h_small), interpolation=cv.INTER_AREA)
+            tpl_src = tpl_gray if self.use_grayscale else tpl
+            if self._use_pyrdown:
+                tpl_small = tpl_src
+                for _ in range(self._pyrdown_steps):
+                    tpl_small = cv.pyrDown(tpl_small)
+                h_small, w_small = tpl_small.shape[:2]
             else:
-                tpl_small = cv.resize(tpl, (w_small, h_small), interpolation=cv.INTER_AREA)
-            
-            self.templates.append(
-                TemplateState(
-                    id=i, path=path, tpl=tpl, tpl_gray=tpl_gray, tpl_small=tpl_small,
-                    w=w, h=h, w_small=w_small, h_small=h_small
-                )
-            )
-            print(f"[T{i}] Loaded: {path} ({w}x{h}) -> small: ({w_small}x{h_small})")
+                w_small = max(1, int(w * self.downscale_factor))
+                h_small = max(1, int(h * self.downscale_factor))
+                tpl_small = cv.resize(tpl_src, (w_small, h_small), interpolation=cv.INTER_AREA)
+
+            # Deeper levels: keep halving while the template stays large enough to be distinctive
+            tpl_pyr = [tpl_src, tpl_small] if self.use_pyramid else [tpl_src]
+            while len(tpl_pyr) < len(self._level_sizes):
+                th, tw = tpl_pyr[-1].shape[:2]
+                if min((th + 1) // 2, (tw + 1) // 2) < self.min_template_side:
+                    break
+                tpl_pyr.append(cv.pyrDown(tpl_pyr[-1]))
 
-        self.executor: Optional[ThreadPoolExecutor] = None
+            state = TemplateState(
+                id=i, path=path, tpl=tpl, tpl_gray=tpl_gray, tpl_small=tpl_small,
+                w=w, h=h, w_small=w_small, h_small=h_small,
+                tpl_pyr=tpl_pyr, top_level=len(tpl_pyr) - 1,
+            )
+            if self.use_opencl:
+                state.u_tpl_pyr = [cv.UMat(level) for level in tpl_pyr]
+            tpl_top = tpl_pyr[-1]
+            top_h, top_w = tpl_top.shape[:2]
+            lvl_w, lvl_h = self._level_sizes[state.top_level]
+            if self._fast_coarse:
+                state.tpl_coarse_zm, state.tpl_coarse_norm, state.tpl_coarse_fft = self._template_spectrum(
+                    tpl_top, state.top_level, with_fft=min(top_w, top_h) >= _DFT_MIN_TEMPLATE_SIDE)
+                state.tpl_coarse_mean = float(tpl_top.mean())
+            if self._fft_full_scan and min(w, h) >= _DFT_MIN_TEMPLATE_SIDE:
+                state.tpl_full_zm, state.tpl_full_norm, state.tpl_full_fft = \
+                    self._template_spectrum(tpl_gray, 0)
+            state.res_buf_coarse = np.empty((max(1, lvl_h - top_h + 1), max(1, lvl_w - top_w + 1)), np.float32)
+            state.res_buf_roi = np.empty((self.search_margin * 2 + 1, self.search_margin * 2 + 1), np.float32)
+            state.res_buf_refine = np.empty((self._refine_margin * 2 + 1, self._refine_margin * 2 + 1), np.float32)
+            self.templates.append(state)
+            print(f"[T{i}] Loaded: {path} ({w}x{h}) -> small: ({w_small}x{h_small}), "
+                  f"coarse level {state.top_level}: ({top_w}x{top_h})")
+
+        # Only build as many frame levels as the deepest template needs
+        self._max_level = max((t.top_level for t in self.templates), default=0)
+
+        # Template geometry + tracking state as parallel int32 arrays (SoA), so per-frame ROI
+        # selection is a handful of vectorized ops instead of ~5 Python ops per template.
+        n_tpl = len(self.templates)
+        self._tpl_wh = np.array([(t.w, t.h) for t in self.templates], np.int32).reshape(n_tpl, 2)
+        self.tpl_w, self.tpl_h = self._tpl_wh[:, 0], self._tpl_wh[:, 1]  # column views of _tpl_wh
+        self.tpl_w_small = np.array([t.w_small for t in self.templates], np.int32)
+        self.tpl_h_small = np.array([t.h_small for t in self.templates], np.int32)
+        self.last_pos = np.full((n_tpl, 2), -1, np.int32)   # (x, y) per template, -1 = not tracked
+        self._rois = np.zeros((n_tpl, 4), np.int32)         # heuristic ROI (x, y, w, h); w == 0 -> skip
+        self._roi_tmp = np.empty((n_tpl, 2), np.int32)
+
+        # Per-frame results live in one pre-allocated structured array; workers write rows by id
+        self._results = np.zeros(len(self.templates), dtype=RESULT_DTYPE)
+        self._results["w"] = self.tpl_w
+        self._results["h"] = self.tpl_h
+        self._result_views = [MatchResultView(self._results, t.id) for t in self.templates]
+        self._results_ro = self._results.view()
+        self._results_ro.flags.writeable = False
+
+        # Persistent workers: each owns a fixed slice of templates, wakes on its Event when
+        # find_all() publishes a frame, and meets the caller at a Barrier when done. This
+        # avoids per-frame submit/Future allocations of a ThreadPoolExecutor.
         self.max_workers = int(max_workers)
-        if self.max_workers and self.max_workers > 0:
-            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._workers: List[threading.Thread] = []
+        self._work_events: List[threading.Event] = []
+        self._barrier: Optional[threading.Barrier] = None
+        self._running = False
+        self._frame_args: tuple = ()
+        self._worker_error: Optional[BaseException] = None
+        # Per-frame spectra / integral images keyed by (kind, level), filled on first use, cleared each frame
+        self._frame_cache: Dict[Tuple[str, int], object] = {}
+        self._frame_cache_lock = threading.Lock()
+        self.pin_workers = bool(pin_workers) and hasattr(os, "sched_setaffinity")
+        if self.max_workers > 0 and self.templates:
+            n_workers = min(self.max_workers, len(self.templates))
+            # Template-level parallelism replaces OpenCV's pixel-level pool; leaving both on
+            # has every worker's matchTemplate fan out across all cores (oversubscription).
+            cv.setNumThreads(1)
+            self._barrier = threading.Barrier(n_workers + 1)
+            self._running = True
+            for wi in range(n_workers):
+                event = threading.Event()
+                worker = threading.Thread(
+                    target=self._worker_loop, args=(wi, n_workers, event),
+                    name=f"MatchWorker-{wi}", daemon=True,
+                )
+                self._work_events.append(event)
+                self._workers.append(worker)
+                worker.start()
+        # Serial vs threaded matching is fixed for the tracker's lifetime; pick it once
+        self._dispatch = self._dispatch_threaded if self._workers else self._dispatch_serial
+        self._last_frame: Optional[np.ndarray] = None
 
         print(f"[MultiTemplateTrackerCV] Total templates: {len(self.templates)}")
         print(f"[MultiTemplateTrackerCV] Confidence: {self.confidence}")
         print(f"[MultiTemplateTrackerCV] ROI margin: {self.search_margin}")
-        print(f"[MultiTemplateTrackerCV] Threads: {self.max_workers if self.executor else 0}")
+        print(f"[MultiTemplateTrackerCV] Capture: {'dxcam' if self._cam is not None else 'mss'}")
+        print(f"[MultiTemplateTrackerCV] Threads: {len(self._workers)}"
+              f"{' (pinned)' if self._workers and self.pin_workers else ''}, OpenCV threads: {cv.getNumThreads()}")
+        print(f"[MultiTemplateTrackerCV] OpenCL: {self.use_opencl}")
         print(f"[MultiTemplateTrackerCV] Grayscale: {self.use_grayscale}")
         print(f"[MultiTemplateTrackerCV] Method: {self.method}")
         print(f"[MultiTemplateTrackerCV] Downscale: {self.downscale_factor} ({'pyramid' if self.use_pyramid else 'disabled'})")
+        print(f"[MultiTemplateTrackerCV] Pyramid levels: {self._max_level + 1}")
         print(f"[MultiTemplateTrackerCV] Skip full scan: {self.skip_full_scan}")
+        print(f"[MultiTemplateTrackerCV] Re-acquire every: {self.refresh_every_n or 'never'} frames")
 
     def shutdown(self):
-        if self.executor:
-            self.executor.shutdown(wait=False)
+        if self._cam is not None:
+            self._cam.release()
+            self._cam = None
+        if not self._workers:
+            return
+        self._running = False
+        for event in self._work_events:
+            event.set()
+        self._barrier.abort()
+        for worker in self._workers:
+            worker.join(timeout=1.0)
+        self._workers = []
+        self._dispatch = self._dispatch_serial
+
+    def _dispatch_serial(self, frame_pyr: List[np.ndarray], match_pyr: list) -> None:
+        for t in self.templates:
+            self._match_one(t, frame_pyr, match_pyr)
+
+    def _dispatch_threaded(self, frame_pyr: List[np.ndarray], match_pyr: list) -> None:
+        self._frame_args = (frame_pyr, match_pyr)
+        for event in self._work_events:
+            event.set()
+        self._barrier.wait()
+        if self._worker_error is not None:
+            err, self._worker_error = self._worker_error, None
+            raise err
+
+    def _worker_loop(self, worker_idx: int, n_workers: int, event: threading.Event):
+        """Match templates worker_idx, worker_idx + n_workers, ... for every published frame."""
+        my_templates = self.templates[worker_idx::n_workers]
+        if self.pin_workers:
+            cpus = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, {cpus[worker_idx % len(cpus)]})  # pid 0 = this thread
+        while True:
+            event.wait()
+            event.clear()
+            if not self._running:
+                return
+            try:
+                for t in my_templates:
+                    self._match_one(t, *self._frame_args)
+            except BaseException as e:
+                self._worker_error = e
+            try:
+                self._barrier.wait()
+            except threading.BrokenBarrierError:
+                return
+
+    def _grab_frame_bgra(self) -> np.ndarray:
+        """Grab full screen as a raw HxWx4 BGRA numpy view (no conversion copy)."""
+        if self._cam is not None:
+            frame = self._cam.grab()
+            if frame is not None:
+                self._cam_frame = frame
+            if self._cam_frame is not None:
+                # dxcam returns None when the screen has not changed since the last grab
+                return self._cam_frame
+        sct_img = self.sct.grab(self.monitor)
+        return np.frombuffer(sct_img.bgra, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+
+    @staticmethod
+    def _make_best_match(method: int, use_opencl: bool = False):
+        """
+        Build a matcher specialized for `method` (fixed at construction).
 
-    def _grab_frame_bgr(self) -> np.ndarray:
-        """Grab full screen as BGR numpy array."""
-        sct_img = self.sct.grab(self.monitor)          # BGRA
-        frame = np.asarray(sct_img, dtype=np.uint8)    # HxWx4
-        frame_bgr = cv.cvtColor(frame, cv.COLOR_BGRA2BGR)
-        return frame_bgr
+        The returned function has signature (frame, tpl, result=None) and returns
+        (best_score, best_x, best_y). For TM_SQDIFF* lower is better and the score is
+        flipped to "higher is better"; for other methods the max is taken directly.
+        `result` is an optional pre-allocated float32 output buffer. With use_opencl the
+        inputs are UMats; the result stays on the device and is reduced by minMaxLoc there.
+        """
+        match_template = cv.matchTemplate
+
+        if use_opencl:
+            min_max_loc = cv.minMaxLoc
+            lower_is_better = method in (cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED)
+
+            def best_match_ocl(frame, tpl, result=None) -> Tuple[float, int, int]:
+                min_val, max_val, min_loc, max_loc = min_max_loc(match_template(frame, tpl, method))
+                if lower_is_better:
+                    return 1.0 - float(min_val), int(min_loc[0]), int(min_loc[1])
+                return float(max_val), int(max_loc[0]), int(max_loc[1])
+
+            return best_match_ocl
+
+        if method in (cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED):
+            min_max_loc = cv.minMaxLoc
+
+            def best_match_min(frame: np.ndarray, tpl: np.ndarray,
+                               result: Optional[np.ndarray] = None) -> Tuple[float, int, int]:
+                min_val, _, min_loc, _ = min_max_loc(match_template(frame, tpl, method, result=result))
+                return 1.0 - float(min_val), int(min_loc[0]), int(min_loc[1])
+
+            return best_match_min
+
+        def best_match_max(frame: np.ndarray, tpl: np.ndarray,
+                           result: Optional[np.ndarray] = None) -> Tuple[float, int, int]:
+            return _argmax_2d(match_template(frame, tpl, method, result=result))
+
+        return best_match_max
 
-    def _best_match(
+    def _dft_pad_for_level(self, level: int) -> np.ndarray:
+        """
+        Reusable zero-padded float32 buffer (optimal DFT size) for a frame pyramid level.
+
+        Coarse correlation runs in the frequency domain: one forward DFT of the level per
+        frame, multiplied by each template's cached spectrum. Only the top-left
+        level-sized block of the buffer is rewritten each frame.
+        """
+        if level not in self._dft_pads:
+            lw, lh = self._level_sizes[level]
+            self._dft_pads[level] = np.zeros(
+                (cv.getOptimalDFTSize(lh), cv.getOptimalDFTSize(lw)), np.float32)
+        return self._dft_pads[level]
+
+    def _template_spectrum(
+        self, tpl: np.ndarray, level: int, with_fft: bool = True,
+    ) -> Tuple[np.ndarray, float, Optional[np.ndarray]]:
+        """Zero-mean float32 copy of tpl, its sum of squares, and its spectrum padded for `level`."""
+        tpl_zm = tpl.astype(np.float32)
+        tpl_zm -= tpl_zm.mean()
+        tpl_fft = None
+        if with_fft:
+            dft_pad = self._dft_pad_for_level(level)
+            tpl_pad = np.zeros_like(dft_pad)
+            tpl_pad[:tpl.shape[0], :tpl.shape[1]] = tpl_zm
+            tpl_fft = cv.dft(tpl_pad)
+        return tpl_zm, float(np.dot(tpl_zm.ravel(), tpl_zm.ravel())), tpl_fft
+
+    def _frame_spectrum(self, level: int, frame: np.ndarray) -> np.ndarray:
+        sh, sw = frame.shape[:2]
+        dft_pad = self._dft_pads[level]
+        dft_pad[:sh, :sw] = frame
+        return cv.dft(dft_pad)
+
+    @staticmethod
+    def _frame_integrals(level: int, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return cv.integral2(frame, sdepth=cv.CV_64F, sqdepth=cv.CV_64F)
+
+    def _per_frame(self, kind: str, level: int, frame: np.ndarray, compute: Callable):
+        """
+        compute(level, frame), evaluated by the first template that needs it this frame and
+        shared with the rest. Frames where every template is held by its ROI heuristic
+        never pay for it.
+        """
+        key = (kind, level)
+        val = self._frame_cache.get(key)
+        if val is None:
+            with self._frame_cache_lock:
+                val = self._frame_cache.get(key)
+                if val is None:
+                    val = self._frame_cache[key] = compute(level, frame)
+        return val
+
+    def _ccoeff_normed_fast(
         self,
         frame: np.ndarray,
+        level: int,
         tpl: np.ndarray,
-        method: int,
+        tpl_zm: np.ndarray,
+        tpl_norm: float,
+        tpl_fft: Optional[np.ndarray],
+        tpl_mean: float,
+        result: Optional[np.ndarray] = None,
     ) -> Tuple[float, int, int]:
         """
-        Return (best_score, best_x, best_y) for matchTemplate.
-        For TM_SQDIFF* lower is better; for others higher is better.
+        TM_CCOEFF_NORMED via TM_CCORR + integral-image normalization.
+
+        The CCOEFF numerator is sum((f - mean_f) * (t - mean_t)) = sum(f * (t - mean_t)).
+        With a cached template spectrum it is evaluated as spectrum product + inverse DFT
+        against the frame level's spectrum, which is transformed once for all templates.
+        Small templates skip the DFT: plain uint8 TM_CCORR, minus mean_t * window sum.
+        The per-window variance comes from integral images in O(1) per pixel; they are
+        shared by all templates on the level. tpl_norm must be > 0.
         """
-        res = cv.matchTemplate(frame, tpl, method)
-        min_val, max_val, min_loc, max_loc = cv.minMaxLoc(res)
-        if method in (cv.TM_SQDIFF, cv.TM_SQDIFF_NORMED):
-            # lower is better: convert to "score where higher is better"
-            score = 1.0 - float(min_val)
-            x, y = min_loc
-        else:
-            score = float(max_val)
-            x, y = max_loc
-        return score, int(x), int(y)
-
-    def _match_one(self, t: TemplateState, frame_bgr: np.ndarray, frame_gray: Optional[np.ndarray],
-                   frame_small: Optional[np.ndarray] = None) -> MatchResult:
-        w, h = t.w, t.h
-
-        # pick channel representation for full-res matching
-        if self.use_grayscale:
-            frame = frame_gray
-            tpl = t.tpl_gray
+        h, w = tpl_zm.shape
+        rh = frame.shape[0] - h + 1
+        rw = frame.shape[1] - w + 1
+        sum_img, sqsum_img = self._per_frame("integral", level, frame, self._frame_integrals)
+        win_sum = sum_img[h:h + rh, w:w + rw] - sum_img[:rh, w:w + rw] - sum_img[h:h + rh, :rw] + sum_img[:rh, :rw]
+
+        if tpl_fft is not None:
+            frame_fft = self._per_frame("dft", level, frame, self._frame_spectrum)
+            spec = cv.mulSpectrums(frame_fft, tpl_fft, 0, conjB=True)
+            num = cv.idft(spec, flags=cv.DFT_REAL_OUTPUT | cv.DFT_SCALE)[:rh, :rw]
         else:
-            frame = frame_bgr
-            tpl = t.tpl
-
-        assert frame is not None
-
-        # Heuristic ROI first (uses full resolution)
-        if t.last_pos is not None:
-            lx, ly = t.last_pos
-            roi_x = max(0, lx - self.search_margin)
-            roi_y = max(0, ly - self.search_margin)
-            roi_w = min(self.search_margin * 2 + w, self.screen_w - roi_x)
-            roi_h = min(self.search_margin * 2 + h, self.screen_h - roi_y)
-
-            # Need ROI >= template size
-            if roi_w >= w and roi_h >= h:
-                roi = frame[roi_y : roi_y + roi_h, roi_x : roi_x + roi_w]
-                score, x, y = self._best_match(roi, tpl, self.method)
-                if score >= self.confidence:
-                    return MatchResult(
-                        id=t.id, found=True,
-                        x=roi_x + x, y=roi_y + y,
-                        w=w, h=h,
-                        score=score,
-                        method="Heuristic",
-                    )
-
-        # PYRAMID MATCHING: search at low resolution first, then refine
-        if self.use_pyramid and frame_small is not None:
+            num = cv.matchTemplate(frame, tpl, cv.TM_CCORR, result=result) - tpl_mean * win_sum
+
+        win_sqsum = sqsum_img[h:h + rh, w:w + rw] - sqsum_img[:rh, w:w + rw] - sqsum_img[h:h + rh, :rw] + sqsum_img[:rh, :rw]
+        var = win_sqsum - win_sum * win_sum / float(w * h)
+        denom = np.sqrt(np.maximum(var, 0.0) * tpl_norm)
+
+        res = np.zeros(num.shape, np.float32)
+        np.divide(num, denom, out=res, where=denom > 1e-6, casting="unsafe")
+        return _argmax_2d(res)
+
+    def _coarse_ccoeff_normed(self, t: TemplateState, frame_top: np.ndarray) -> Tuple[float, int, int]:
+        """TM_CCOEFF_NORMED at the template's top pyramid level (see _ccoeff_normed_fast)."""
+        tpl_top = t.tpl_pyr[t.top_level]
+        if t.tpl_coarse_norm <= 0.0:
+            # Flat template: normalization is undefined, let OpenCV handle it
+            return self._best_match(frame_top, tpl_top)
+        return self._ccoeff_normed_fast(frame_top, t.top_level, tpl_top, t.tpl_coarse_zm, t.tpl_coarse_norm,
+                                        t.tpl_coarse_fft, t.tpl_coarse_mean, t.res_buf_coarse)
+
+    def _compute_rois(self) -> None:
+        """Fill self._rois with this frame's heuristic search windows around last positions."""
+        margin = self.search_margin
+        last, wh, rois, tmp = self.last_pos, self._tpl_wh, self._rois, self._roi_tmp
+        # top-left = max(0, last - margin)
+        np.subtract(last, margin, out=tmp)
+        np.maximum(tmp, 0, out=rois[:, :2])
+        # size = min(2 * margin + tpl_size, screen - top-left)
+        np.subtract(self._screen_wh, rois[:, :2], out=tmp)
+        np.minimum(wh + 2 * margin, tmp, out=rois[:, 2:])
+        # Untracked templates or windows smaller than the template are skipped
+        skip = (last[:, 0] < 0) | (rois[:, 2] < wh[:, 0]) | (rois[:, 3] < wh[:, 1])
+        rois[skip, 2] = 0
+
+    def _match_one(self, t: TemplateState, frame_pyr: List[np.ndarray],
+                   match_pyr: Optional[list] = None) -> None:
+        """
+        Match one template and write its row of self._results.
+
+        frame_pyr[0] is the full-res frame (gray or BGR per use_grayscale), frame_pyr[1]
+        the downscaled frame, deeper entries successive pyrDown halvings. match_pyr is
+        what actually gets matched: the same arrays, or their UMats with use_opencl.
+        Geometry always comes from frame_pyr.
+        """
+        w, h = self._tpl_wh[t.id].tolist()
+        results = self._results
+        confidence = self.confidence
+        best_match = self._best_match
+        crop = self._crop
+        if match_pyr is None:
+            match_pyr = frame_pyr
+        tpl_pyr = t.u_tpl_pyr if self.use_opencl else t.tpl_pyr
+        frame = frame_pyr[0]
+        tpl = tpl_pyr[0]
+
+        # Heuristic ROI first (uses full resolution; window precomputed by _compute_rois)
+        roi_x, roi_y, roi_w, roi_h = self._rois[t.id].tolist()
+        if roi_w:
+            roi = crop(match_pyr[0], roi_x, roi_y, roi_w, roi_h)
+            score, x, y = best_match(roi, tpl, t.res_buf_roi)
+            if score >= confidence:
+                results[t.id] = (True, roi_x + x, roi_y + y, w, h, score, METHOD_HEURISTIC)
+                return
+
+        # PYRAMID MATCHING: search the coarsest level, cascade down, then refine at full res
+        if self.use_pyramid:
+            top = t.top_level
+            frame_top = frame_pyr[top]
+            top_h, top_w = t.tpl_pyr[top].shape[:2]
             # Step 1: Match at low resolution
-            if frame_small.shape[1] >= t.w_small and frame_small.shape[0] >= t.h_small:
-                score_small, x_small, y_small = self._best_match(frame_small, t.tpl_small, self.method)
-                
+            if frame_top.shape[1] >= top_w and frame_top.shape[0] >= top_h:
+                if self._fast_coarse:
+                    score_small, x_small, y_small = self._coarse_ccoeff_normed(t, frame_top)
+                else:
+                    score_small, x_small, y_small = best_match(match_pyr[top], tpl_pyr[top], t.res_buf_coarse)
+
                 # Lower threshold for coarse search (we'll verify at full res)
-                if score_small >= self.confidence * 0.9:
+                if score_small >= self._coarse_confidence:
+                    # Step 1b: Walk down to level 1, matching only a small window around the
+                    # doubled position at each level
+                    for lvl in range(top - 1, 0, -1):
+                        lvl_frame = frame_pyr[lvl]
+                        th, tw = t.tpl_pyr[lvl].shape[:2]
+                        wx = max(0, x_small * 2 - _PYR_CASCADE_MARGIN)
+                        wy = max(0, y_small * 2 - _PYR_CASCADE_MARGIN)
+                        ww = min(tw + _PYR_CASCADE_MARGIN * 2, lvl_frame.shape[1] - wx)
+                        wh = min(th + _PYR_CASCADE_MARGIN * 2, lvl_frame.shape[0] - wy)
+                        if ww < tw or wh < th:
+                            x_small, y_small = x_small * 2, y_small * 2
+                            continue
+                        _, dx, dy = best_match(crop(match_pyr[lvl], wx, wy, ww, wh), tpl_pyr[lvl])
+                        x_small, y_small = wx + dx, wy + dy
+
                     # Step 2: Scale coordinates back to full resolution
                     scale = 1.0 / self.downscale_factor
                     x_full = int(x_small * scale)
                     y_full = int(y_small * scale)
                     
                     # Step 3: Refine in a small ROI at full resolution
-                    refine_margin = max(20, int(50 / self.downscale_factor))
+                    refine_margin = self._refine_margin
                     roi_x = max(0, x_full - refine_margin)
                     roi_y = max(0, y_full - refine_margin)
                     roi_w = min(w + refine_margin * 2, self.screen_w - roi_x)
                     roi_h = min(h + refine_margin * 2, self.screen_h - roi_y)
                     
                     if roi_w >= w and roi_h >= h:
-                        roi = frame[roi_y : roi_y + roi_h, roi_x : roi_x + roi_w]
-                        score, x, y = self._best_match(roi, tpl, self.method)
-                        if score >= self.confidence:
-                            return MatchResult(
-                                id=t.id, found=True,
-                                x=roi_x + x, y=roi_y + y,
-                                w=w, h=h,
-                                score=score,
-                                method="Pyramid",
-                            )
+                        roi = crop(match_pyr[0], roi_x, roi_y, roi_w, roi_h)
+                        score, x, y = best_match(roi, tpl, t.res_buf_refine)
+                        if score >= confidence:
+                            results[t.id] = (True, roi_x + x, roi_y + y, w, h, score, METHOD_PYRAMID)
+                            return
 
         # Full scan fallback (only if pyramid disabled or skip_full_scan is False)
         if not self.skip_full_scan:
             if frame.shape[1] >= w and frame.shape[0] >= h:
-                score, x, y = self._best_match(frame, tpl, self.method)
-                if score >= self.confidence:
-                    return MatchResult(
-                        id=t.id, found=True,
-                        x=x, y=y,
-                        w=w, h=h,
-                        score=score,
-                        method="Full Scan",
-                    )
-
-        return MatchResult(
-            id=t.id, found=False,
-            x=0, y=0,
-            w=w, h=h,
-            score=0.0,
-            method="Not Found",
-        )
-
-    def find_all(self) -> List[MatchResult]:
-        frame_bgr = self._grab_frame_bgr()
-        self._last_frame = frame_bgr  # Cache for get_preview_frame()
-        
-        frame_gray = cv.cvtColor(frame_bgr, cv.COLOR_BGR2GRAY) if self.use_grayscale else None
-        
-        # Create downscaled frame for pyramid matching
-        # Use INTER_NEAREST for speed (less accurate but much faster than INTER_AREA)
-        frame_small = None
+                if t.tpl_full_fft is not None and t.tpl_full_norm > 0.0:
+                    score, x, y = self._ccoeff_normed_fast(frame, 0, tpl, t.tpl_full_zm, t.tpl_full_norm,
+                                                           t.tpl_full_fft, 0.0)
+                else:
+                    score, x, y = best_match(match_pyr[0], tpl)
+                if score >= confidence:
+                    results[t.id] = (True, x, y, w, h, score, METHOD_FULL_SCAN)
+                    return
+
+        results[t.id] = (False, 0, 0, w, h, 0.0, METHOD_NOT_FOUND)
+
+    def find_all(self) -> List[MatchResultView]:
+        """Match all templates against a fresh frame.
+
+        Returns one MatchResultView per template. The list and views are reused
+        across calls; the raw rows are also available as self.results.
+        """
+        frame_bgra = self._grab_frame_bgra()
+        self._last_frame = frame_bgra  # Cache for get_preview_frame() (BGRA, converted at draw time)
+
+        # One cvtColor pass from BGRA into the persistent full-res buffer: GRAY (4 bytes in /
+        # 1 out, OpenCV's fixed-point SIMD kernel for 8U) or BGR when color matching is requested.
+        frame = cv.cvtColor(frame_bgra, self._to_match, dst=self._frame_buf)
+        frame_pyr = [frame]
+
+        # Create downscaled frames for pyramid matching
         if self.use_pyramid:
-            if self.use_grayscale:
-                frame_small = cv.resize(frame_gray, (self.screen_w_small, self.screen_h_small), 
-                                        interpolation=cv.INTER_NEAREST)
+            frame_small = frame
+            if self._use_pyrdown:
+                for _ in range(self._pyrdown_steps):
+                    frame_small = cv.pyrDown(frame_small)
+            elif self._decimate_step:
+                # Same pixels as INTER_NEAREST; matchTemplate needs a contiguous buffer
+                step = self._decimate_step
+                frame_small = np.ascontiguousarray(frame_small[::step, ::step])
             else:
-                frame_small = cv.resize(frame_bgr, (self.screen_w_small, self.screen_h_small), 
+                # Use INTER_NEAREST for speed (less accurate but much faster than INTER_AREA)
+                frame_small = cv.resize(frame_small, (self.screen_w_small, self.screen_h_small),
                                         interpolation=cv.INTER_NEAREST)
-
-        if self.executor:
-            futures = [self.executor.submit(self._match_one, t, frame_bgr, frame_gray, frame_small) 
-                      for t in self.templates]
-            results = [f.result() for f in futures]
+            frame_pyr.append(frame_small)
+            while len(frame_pyr) <= self._max_level:
+                frame_pyr.append(cv.pyrDown(frame_pyr[-1]))
+
+        # Coarse/full-scan DFT + integral precompute is lazy (see _per_frame); drop last frame's
+        self._frame_cache.clear()
+
+        # T-API: upload each level once per frame; ROIs are views into the device buffers
+        match_pyr = [cv.UMat(level) for level in frame_pyr] if self.use_opencl else frame_pyr
+
+        # Each template runs exactly one entry path: its ROI heuristic when tracked, otherwise
+        # the coarse search. Every refresh_every_n frames all templates re-acquire globally
+        # so a lock on a look-alike near the old position cannot persist.
+        self._frame_idx += 1
+        if self.refresh_every_n and self._frame_idx % self.refresh_every_n == 0:
+            self._rois[:, 2] = 0
         else:
-            results = [self._match_one(t, frame_bgr, frame_gray, frame_small) for t in self.templates]
-
-        # Update per-template state
-        for r in results:
-            t = self.templates[r.id]
-            if r.found:
-                t.last_pos = (r.x, r.y)
-                t.found = True
-            else:
-                t.last_pos = None
-                t.found = False
+            self._compute_rois()
+
+        self._dispatch(frame_pyr, match_pyr)
+
+        # Update per-template tracking state (found -> last position, else untracked)
+        results = self._results
+        found = results["found"]
+        self.last_pos[:, 0] = np.where(found, results["x"], -1)
+        self.last_pos[:, 1] = np.where(found, results["y"], -1)
 
-        return results
+        return self._result_views
+
+    @property
+    def results(self) -> np.ndarray:
+        """Read-only view of the last find_all() rows (RESULT_DTYPE, one per template id)."""
+        return self._results_ro
 
     def get_preview_frame(self) -> np.ndarray:
-        """Return cached frame from last find_all() - no extra screen grab."""
-        if hasattr(self, '_last_frame') and self._last_frame is not None:
+        """Return cached BGRA frame from last find_all() - no extra screen grab.
+
+        The frame is a read-only view over the capture buffer; convert it
+        (e.g. with cv.COLOR_BGRA2BGR) before drawing on it.
+        """
+        if self._last_frame is not None:
             return self._last_frame
-        return self._grab_frame_bgr()
+        return self._grab_frame_bgra()
 
 
 def run_tracking_loop_cv(
@@ -318,10 +787,17 @@ def run_tracking_loop_cv(
         (0, 255, 255),
     ]
 
+    preview_size = (1280, 720)
+    sx = preview_size[0] / tracker.screen_w
+    sy = preview_size[1] / tracker.screen_h
+
     frame_count = 0
     start_time = time.time()
 
-    stats: Dict[int, Dict[str, int]] = {i: {"heuristic": 0, "full": 0, "pyramid": 0, "found": 0} for i in range(len(tracker.templates))}
+    # Per-template counts indexed by method code (METHOD_*); one fancy-indexed add per frame
+    n_tpl = len(tracker.templates)
+    stats = np.zeros((n_tpl, len(METHOD_NAMES)), np.int64)
+    tpl_ids = np.arange(n_tpl)
 
     try:
         while True:
@@ -332,17 +808,9 @@ def run_tracking_loop_cv(
             elapsed = time.time() - start_time
             actual_fps = frame_count / elapsed if elapsed > 0 else 0.0
 
-            found_any = False
-            for r in results:
-                if r.found:
-                    found_any = True
-                    stats[r.id]["found"] += 1
-                    if r.method == "Heuristic":
-                        stats[r.id]["heuristic"] += 1
-                    elif r.method == "Pyramid":
-                        stats[r.id]["pyramid"] += 1
-                    elif r.method == "Full Scan":
-                        stats[r.id]["full"] += 1
+            rows = tracker.results
+            stats[tpl_ids, rows["method"]] += 1
+            found_any = bool(rows["found"].any())
 
             # log (light)
             if found_any:
@@ -354,19 +822,20 @@ def run_tracking_loop_cv(
                     print(f"Frame {frame_count} (FPS: {actual_fps:.1f}): None found")
 
             if show_preview:
-                frame = tracker.get_preview_frame()
+                # Downscale first, then draw: overlays touch the 1280x720 buffer, not the 1080p one
+                preview = cv.cvtColor(cv.resize(tracker.get_preview_frame(), preview_size), cv.COLOR_BGRA2BGR)
                 for r in results:
                     if r.found:
                         c = colors[r.id % len(colors)]
-                        cv.rectangle(frame, (r.x, r.y), (r.x + r.w, r.y + r.h), c, 2)
-                        cv.putText(frame, f"T{r.id} {r.score:.2f}", (r.x, max(15, r.y - 8)),
+                        x0, y0 = int(r.x * sx), int(r.y * sy)
+                        cv.rectangle(preview, (x0, y0), (int((r.x + r.w) * sx), int((r.y + r.h) * sy)), c, 2)
+                        cv.putText(preview, f"T{r.id} {r.score:.2f}", (x0, max(15, y0 - 8)),
                                    cv.FONT_HERSHEY_SIMPLEX, 0.5, c, 2)
 
-                cv.putText(frame, f"FPS: {actual_fps:.1f}", (10, 25), cv.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                cv.putText(preview, f"FPS: {actual_fps:.1f}", (10, 25), cv.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
                 found_count = sum(1 for r in results if r.found)
-                cv.putText(frame, f"Found: {found_count}/{len(results)}", (10, 55), cv.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv.putText(preview, f"Found: {found_count}/{len(results)}", (10, 55), cv.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
-                preview = cv.resize(frame, (1280, 720))
                 cv.imshow("MultiTemplateTrackerCV", preview)
                 if cv.waitKey(1) & 0xFF == ord("q"):
                     break
@@ -392,11 +861,11 @@ def run_tracking_loop_cv(
         print(f"Total frames: {frame_count}")
         print(f"Average FPS: {frame_count / total_time:.1f}" if total_time > 0 else "Average FPS: n/a")
         print()
-        for tid, s in stats.items():
-            total = s["found"]
+        for tid, s in enumerate(stats.tolist()):
+            total = frame_count - s[METHOD_NOT_FOUND]
             pct = 100.0 * total / max(1, frame_count)
-            h_pct = 100.0 * s["heuristic"] / max(1, total) if total > 0 else 0.0
-            p_pct = 100.0 * s["pyramid"] / max(1, total) if total > 0 else 0.0
+            h_pct = 100.0 * s[METHOD_HEURISTIC] / max(1, total) if total > 0 else 0.0
+            p_pct = 100.0 * s[METHOD_PYRAMID] / max(1, total) if total > 0 else 0.0
             print(f"T{tid}: Found {total} ({pct:.1f}%), Heuristic: {h_pct:.1f}%, Pyramid: {p_pct:.1f}%")
 
 
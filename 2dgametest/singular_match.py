@@ -1,25 +1,23 @@
 """
-Maximum speed template matching using PyAutoGUI with all optimizations:
+Maximum speed template matching using OpenCV with all optimizations:
 1. ROI/Region search (heuristic search around last position)
 2. Pre-loaded template image
-3. mss for fast screenshots
+3. mss for fast screenshots (raw BGRA buffer, no PIL roundtrip)
 4. grayscale matching
 5. DOWNSCALING - shrink images before matching for massive speedup
 6. Optional: disable preview for max speed
 """
 
-import pyautogui
 import cv2 as cv
 import numpy as np
 import mss
 import time
 import os
-from PIL import Image
 
 
 class FastSpriteTracker:
     """
-    Maximum speed sprite tracking using PyAutoGUI with downscaling.
+    Maximum speed sprite tracking using OpenCV matchTemplate with downscaling.
     """
     
     def __init__(self, template_path: str, confidence: float = 0.7, 
@@ -33,21 +31,24 @@ class FastSpriteTracker:
             grayscale: Use grayscale matching (faster)
             scale: Downscale factor (0.5 = half size, much faster)
         """
-        # Pre-load template image
-        self.template_original = Image.open(template_path)
+        # Pre-load template image (in the colour space frames are matched in)
+        self.grayscale = grayscale
+        self.template_original = cv.imread(template_path, cv.IMREAD_GRAYSCALE if grayscale else cv.IMREAD_COLOR)
+        if self.template_original is None:
+            raise FileNotFoundError(f"Failed to load template: {template_path}")
         self.template_path = template_path
-        self.original_w, self.original_h = self.template_original.size
+        self.original_h, self.original_w = self.template_original.shape[:2]
         
         # Downscale template for faster matching (Optimization #5)
         self.scale = scale
-        new_w = int(self.original_w * scale)
-        new_h = int(self.original_h * scale)
-        self.template = self.template_original.resize((new_w, new_h), Image.BILINEAR)
+        new_w = max(1, int(self.original_w * scale))
+        new_h = max(1, int(self.original_h * scale))
+        self.template = cv.resize(self.template_original, (new_w, new_h), interpolation=cv.INTER_AREA)
         self.w, self.h = new_w, new_h
+        self._to_match = cv.COLOR_BGRA2GRAY if grayscale else cv.COLOR_BGRA2BGR
         
         self.confidence = confidence
         self.search_margin = int(search_margin * scale)  # Scale margin too
-        self.grayscale = grayscale
         
         # Last known position for heuristic search (in SCALED coords)
         self.last_pos = None
@@ -65,12 +66,25 @@ class FastSpriteTracker:
         print(f"[FastSpriteTracker] Scaled size: {self.w}x{self.h} (scale={scale})")
         print(f"[FastSpriteTracker] Confidence: {confidence} | Grayscale: {grayscale}")
     
+    def _grab(self, region) -> np.ndarray:
+        """Grab a region and convert it once from mss's BGRA buffer to the matching colour space."""
+        sct_img = self.sct.grab(region)
+        bgra = np.frombuffer(sct_img.bgra, np.uint8).reshape(sct_img.height, sct_img.width, 4)
+        return cv.cvtColor(bgra, self._to_match)
+    
+    def _locate(self, haystack: np.ndarray):
+        """Best TM_CCOEFF_NORMED match as (x, y), or None below confidence."""
+        if haystack.shape[0] < self.h or haystack.shape[1] < self.w:
+            return None
+        res = cv.matchTemplate(haystack, self.template, cv.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv.minMaxLoc(res)
+        return max_loc if max_val >= self.confidence else None
+    
     def capture_and_scale(self):
         """Capture full screen and downscale for faster matching."""
-        sct_img = self.sct.grab(self.monitor)
-        img = Image.frombytes('RGB', (sct_img.width, sct_img.height), sct_img.rgb)
+        frame = self._grab(self.monitor)
         # Downscale for speed
-        return img.resize((self.scaled_screen_w, self.scaled_screen_h), Image.BILINEAR)
+        return cv.resize(frame, (self.scaled_screen_w, self.scaled_screen_h), interpolation=cv.INTER_AREA)
     
     def capture_region_and_scale(self, x, y, w, h):
         """Capture specific region and downscale."""
@@ -86,13 +100,12 @@ class FastSpriteTracker:
             'width': min(screen_w, self.screen_w - screen_x),
             'height': min(screen_h, self.screen_h - screen_y)
         }
-        sct_img = self.sct.grab(region)
-        img = Image.frombytes('RGB', (sct_img.width, sct_img.height), sct_img.rgb)
+        frame = self._grab(region)
         
         # Downscale
-        scaled_w = int(region['width'] * self.scale)
-        scaled_h = int(region['height'] * self.scale)
-        return img.resize((scaled_w, scaled_h), Image.BILINEAR), region
+        scaled_w = max(1, int(region['width'] * self.scale))
+        scaled_h = max(1, int(region['height'] * self.scale))
+        return cv.resize(frame, (scaled_w, scaled_h), interpolation=cv.INTER_AREA), region
     
     def find_sprite(self):
         """
@@ -115,21 +128,13 @@ class FastSpriteTracker:
             # Capture and scale the ROI
             roi_screenshot, screen_region = self.capture_region_and_scale(roi_x, roi_y, roi_w, roi_h)
             
-            try:
-                location = pyautogui.locate(
-                    self.template, 
-                    roi_screenshot,
-                    confidence=self.confidence,
-                    grayscale=self.grayscale
-                )
-            except Exception:
-                location = None
+            location = self._locate(roi_screenshot)
             
             if location is not None:
                 # Convert back to screen coords
                 # ROI offset in screen coords
-                screen_x = screen_region['left'] + int(location.left / self.scale)
-                screen_y = screen_region['top'] + int(location.top / self.scale)
+                screen_x = screen_region['left'] + int(location[0] / self.scale)
+                screen_y = screen_region['top'] + int(location[1] / self.scale)
                 
                 # Update last_pos in scaled coords
                 self.last_pos = (int(screen_x * self.scale), int(screen_y * self.scale))
@@ -139,23 +144,15 @@ class FastSpriteTracker:
         # Full screen search (fallback)
         screenshot = self.capture_and_scale()
         
-        try:
-            location = pyautogui.locate(
-                self.template,
-                screenshot,
-                confidence=self.confidence,
-                grayscale=self.grayscale
-            )
-        except Exception:
-            location = None
+        location = self._locate(screenshot)
         
         if location is not None:
             # Convert scaled coords to screen coords
-            screen_x = int(location.left / self.scale)
-            screen_y = int(location.top / self.scale)
+            screen_x = int(location[0] / self.scale)
+            screen_y = int(location[1] / self.scale)
             
             # Store in scaled coords
-            self.last_pos = (location.left, location.top)
+            self.last_pos = location
             
             return True, screen_x, screen_y, self.original_w, self.original_h, "Full Scan"
         
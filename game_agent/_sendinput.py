@@ -0,0 +1,229 @@
+"""
+Batched input submission for Actions.flush().
+
+Each pydirectinput.keyDown/keyUp/moveTo/mouseDown call is its own SendInput
+syscall (plus pydirectinput.PAUSE of sleep after it). On Windows, InputBatch
+instead collects a frame's events into a reusable ctypes INPUT array and submits
+them with ONE SendInput call. Elsewhere (or without a usable user32),
+make_batch() returns a pass-through that forwards to pydirectinput immediately.
+"""
+
+import ctypes
+import sys
+from typing import Optional, Tuple
+
+import pydirectinput
+
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_ABSOLUTE = 0x8000
+
+_ULONG_PTR = ctypes.c_size_t  # pointer-sized, matches dwExtraInfo on 32/64-bit
+
+# Keys pydirectinput.keyDown/keyUp send with KEYEVENTF_EXTENDEDKEY; without it their
+# scancodes are read as the numpad 8/2/4/6 keys
+_EXTENDED_KEYS = frozenset(("up", "down", "left", "right"))
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", _ULONG_PTR),
+    ]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", ctypes.c_ushort),
+        ("wScan", ctypes.c_ushort),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", _ULONG_PTR),
+    ]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("u", _INPUTUNION)]
+
+
+def _keybd_input(scancode: int, flags: int) -> INPUT:
+    event = INPUT(type=INPUT_KEYBOARD)
+    event.u.ki = KEYBDINPUT(wVk=0, wScan=scancode, dwFlags=flags)
+    return event
+
+
+def _key_flags(key: str) -> int:
+    if key in _EXTENDED_KEYS:
+        return KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY
+    return KEYEVENTF_SCANCODE
+
+
+def _mouse_input(flags: int, dx: int = 0, dy: int = 0) -> INPUT:
+    event = INPUT(type=INPUT_MOUSE)
+    event.u.mi = MOUSEINPUT(dx=dx, dy=dy, dwFlags=flags)
+    return event
+
+
+class InputBatch:
+    """
+    Per-frame event buffer submitted with a single user32.SendInput call.
+
+    Every key-down/key-up and mouse-button INPUT record is built once up front;
+    queuing one is a single struct copy into the reusable INPUT array, which grows
+    only if a frame ever queues more events than it holds.
+    """
+
+    def __init__(self, user32, capacity: int = 16):
+        self._send_input = user32.SendInput
+        self._screen_w = max(1, user32.GetSystemMetrics(0))  # SM_CXSCREEN
+        self._screen_h = max(1, user32.GetSystemMetrics(1))  # SM_CYSCREEN
+        scancodes = pydirectinput.KEYBOARD_MAPPING
+        self._down = {k: _keybd_input(sc, _key_flags(k)) for k, sc in scancodes.items()}
+        self._up = {k: _keybd_input(sc, _key_flags(k) | KEYEVENTF_KEYUP) for k, sc in scancodes.items()}
+        self._mouse_down = _mouse_input(MOUSEEVENTF_LEFTDOWN)
+        self._mouse_up = _mouse_input(MOUSEEVENTF_LEFTUP)
+        self._buttons = {
+            "left": (self._mouse_down, self._mouse_up),
+            "right": (_mouse_input(MOUSEEVENTF_RIGHTDOWN), _mouse_input(MOUSEEVENTF_RIGHTUP)),
+            "middle": (_mouse_input(MOUSEEVENTF_MIDDLEDOWN), _mouse_input(MOUSEEVENTF_MIDDLEUP)),
+        }
+        self._buf = (INPUT * capacity)()
+        self._n = 0
+
+    def _reserve(self, count: int):
+        if self._n + count > len(self._buf):
+            grown = (INPUT * max(2 * len(self._buf), self._n + count))()
+            ctypes.memmove(grown, self._buf, ctypes.sizeof(self._buf))
+            self._buf = grown
+
+    def _push(self, event: INPUT):
+        self._reserve(1)
+        self._buf[self._n] = event
+        self._n += 1
+
+    def _absolute_move(self, x: int, y: int) -> INPUT:
+        # Absolute coordinates are normalized to 0..65535 across the primary display
+        return _mouse_input(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE,
+                            (x * 65536) // self._screen_w + 1, (y * 65536) // self._screen_h + 1)
+
+    # Names outside pydirectinput's tables are skipped, as pydirectinput itself does
+
+    def key_down(self, key: str):
+        event = self._down.get(key)
+        if event is not None:
+            self._push(event)
+
+    def key_up(self, key: str):
+        event = self._up.get(key)
+        if event is not None:
+            self._push(event)
+
+    def move_to(self, x: int, y: int):
+        self._push(self._absolute_move(x, y))
+
+    def move_by(self, dx: int, dy: int):
+        self._push(_mouse_input(MOUSEEVENTF_MOVE, dx, dy))
+
+    def mouse_down(self, button: str = "left"):
+        events = self._buttons.get(button)
+        if events is not None:
+            self._push(events[0])
+
+    def mouse_up(self, button: str = "left"):
+        events = self._buttons.get(button)
+        if events is not None:
+            self._push(events[1])
+
+    def send(self):
+        """Submit everything queued since the last send() in one syscall."""
+        if self._n:
+            self._send_input(self._n, self._buf, ctypes.sizeof(INPUT))
+            self._n = 0
+
+    def flush_frame(self, release_keys, press_keys, target: Optional[Tuple[int, int]] = None, button: int = 0):
+        """
+        Queue a whole frame and send it: key-ups, key-downs, an optional absolute
+        move to `target`, and a left-button transition (+1 down, -1 up, 0 none).
+        """
+        self._reserve(len(release_keys) + len(press_keys) + 2)
+        buf, n = self._buf, self._n
+        up, down = self._up, self._down
+        for key in release_keys:
+            event = up.get(key)
+            if event is not None:
+                buf[n] = event
+                n += 1
+        for key in press_keys:
+            event = down.get(key)
+            if event is not None:
+                buf[n] = event
+                n += 1
+        if target is not None:
+            buf[n] = self._absolute_move(target[0], target[1])
+            n += 1
+        if button:
+            buf[n] = self._mouse_down if button > 0 else self._mouse_up
+            n += 1
+        if n:
+            self._send_input(n, buf, ctypes.sizeof(INPUT))
+        self._n = 0
+
+
+class PyDirectInputBatch:
+    """Same interface as InputBatch, but every event goes straight to pydirectinput."""
+
+    key_down = staticmethod(pydirectinput.keyDown)
+    key_up = staticmethod(pydirectinput.keyUp)
+    move_to = staticmethod(pydirectinput.moveTo)
+    move_by = staticmethod(pydirectinput.move)
+    mouse_down = staticmethod(pydirectinput.mouseDown)
+    mouse_up = staticmethod(pydirectinput.mouseUp)
+
+    def send(self):
+        pass
+
+    def flush_frame(self, release_keys, press_keys, target: Optional[Tuple[int, int]] = None, button: int = 0):
+        for key in release_keys:
+            pydirectinput.keyUp(key)
+        for key in press_keys:
+            pydirectinput.keyDown(key)
+        if target is not None:
+            pydirectinput.moveTo(target[0], target[1])
+        if button > 0:
+            pydirectinput.mouseDown()
+        elif button < 0:
+            pydirectinput.mouseUp()
+
+
+def make_batch():
+    """InputBatch on Windows, PyDirectInputBatch everywhere else."""
+    if sys.platform == "win32":
+        try:
+            user32 = ctypes.WinDLL("user32", use_last_error=True)
+            user32.SendInput.argtypes = (ctypes.c_uint, ctypes.POINTER(INPUT), ctypes.c_int)
+            user32.SendInput.restype = ctypes.c_uint
+            return InputBatch(user32)
+        except (OSError, AttributeError) as e:
+            print(f"[Actions] SendInput batching unavailable ({e}), using pydirectinput")
+    return PyDirectInputBatch()
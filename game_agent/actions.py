@@ -1,5 +1,5 @@
 """
-Non-blocking game action system using pydirectinput.
+Non-blocking game action system (batched SendInput on Windows, pydirectinput elsewhere).
 
 Design: Scripts declare INTENT each frame (e.g. "I want to move left and attack").
 The script_runner calls flush() once per frame to reconcile intent with actual inputs.
@@ -10,9 +10,28 @@ import pydirectinput
 import time
 from typing import Optional, Tuple
 
+from _sendinput import make_batch
 
-# Minimal pause between pydirectinput calls — just enough for the OS to register inputs
-pydirectinput.PAUSE = 0.005
+
+# No automatic sleep after pydirectinput calls: the OS queues key/mouse transitions in
+# order without userspace gaps, and the only timing the game needs (the dash double-tap)
+# is handled explicitly by flush()'s dash state machine.
+pydirectinput.PAUSE = 0
+
+# Movement keys as bits of an int mask: held/desired state diffs are two int ops, no sets.
+# Bit i is MOVEMENT_KEYS[i], and every press/release batch (including release_all on
+# shutdown) goes out in this fixed order, independent of the order keys were requested.
+MOVEMENT_KEYS = ('a', 'd', 'space', 's', 'b')
+KEY_A, KEY_D, KEY_SPACE, KEY_S, KEY_B = (1 << i for i in range(len(MOVEMENT_KEYS)))
+_KEY_BITS = {key: 1 << i for i, key in enumerate(MOVEMENT_KEYS)}
+# Key names for every mask value, in MOVEMENT_KEYS order: a release/press diff is one table lookup
+_MASK_KEYS = tuple(tuple(key for i, key in enumerate(MOVEMENT_KEYS) if mask >> i & 1)
+                   for mask in range(1 << len(MOVEMENT_KEYS)))
+# Reconciliation specialized for the fixed key set: every (held, desired) pair maps to its
+# precomputed (keys to release, keys to press), indexed by held << len(MOVEMENT_KEYS) | desired
+_TRANSITIONS = tuple((_MASK_KEYS[held & ~desired], _MASK_KEYS[desired & ~held])
+                     for held in range(len(_MASK_KEYS)) for desired in range(len(_MASK_KEYS)))
+_KEY_SHIFT = len(MOVEMENT_KEYS)
 
 
 class Actions:
@@ -27,16 +46,32 @@ class Actions:
     with zero performance penalty — the engine handles it all in one pass.
     """
     
-    def __init__(self):
+    def __init__(self, mouse_move_threshold: int = 1):
+        """
+        Args:
+            mouse_move_threshold: Skip moveTo while the aim target is within this many
+                pixels (|dx| + |dy|) of the last position sent. The default 1 skips only
+                moves to the exact same target; with a larger value small drifts
+                accumulate against the last sent position, so they are only coalesced.
+        """
         # --- Persistent state (survives across frames) ---
-        self._held_keys: set = set()       # Keys currently physically held down
+        self._held_mask: int = 0           # KEY_* bits currently physically held down
         self._mouse_is_down: bool = False  # Whether mouse button is currently held
+        self._last_mouse_sent: Optional[Tuple[int, int]] = None  # Last position passed to moveTo
+        self.mouse_move_threshold = int(mouse_move_threshold)
+        self._dash_key: Optional[str] = None  # Key of the dash in flight
+        self._dash_phase: int = 0             # Next _DASH_* step of that dash (0 = no dash in flight)
+        self._dash_deadline: float = 0.0      # perf_counter() time that step is due
         
         # --- Per-frame intent (reset after every flush) ---
-        self._desired_keys: set = set()             # Keys the script wants held this frame
+        self._desired_mask: int = 0                  # KEY_* bits the script wants held this frame
         self._mouse_target: Optional[Tuple[int, int]] = None  # Where to aim (x, y)
         self._want_attack: bool = False              # Whether to hold mouse button
-        self._queued_dashes: list = []               # Queued dash directions ('left'/'right')
+        self._next_dash: Optional[str] = None        # Key of the first dash queued this frame ('a'/'d')
+        
+        # --- Output: queues this frame's events, submitted together at the end of flush() ---
+        self._out = make_batch()
+
     
     # =========================================================
     # MOVEMENT — Call these to hold a direction key this frame
@@ -44,23 +79,23 @@ class Actions:
     
     def move_left(self):
         """Hold the left movement key (A) this frame."""
-        self._desired_keys.add('a')
+        self._desired_mask |= KEY_A
     
     def move_right(self):
         """Hold the right movement key (D) this frame."""
-        self._desired_keys.add('d')
+        self._desired_mask |= KEY_D
     
     def fly_up(self):
         """Hold the fly/jump key (Space) this frame."""
-        self._desired_keys.add('space')
+        self._desired_mask |= KEY_SPACE
     
     def move_down(self):
         """Hold the down key (S) this frame."""
-        self._desired_keys.add('s')
+        self._desired_mask |= KEY_S
     
     def move_down_fast(self):
         """Hold the fast-fall key (B) this frame."""
-        self._desired_keys.add('b')
+        self._desired_mask |= KEY_B
     
     # =========================================================
     # COMBAT — Aim and hold attack this frame
@@ -73,20 +108,35 @@ class Actions:
         to (x, y) and the left mouse button is held. When you stop calling
         this, the mouse button is automatically released next frame.
         """
-        self._mouse_target = (int(x), int(y))
+        if type(x) is int and type(y) is int:
+            self._mouse_target = (x, y)
+        else:
+            # Tracker coordinates may arrive as numpy ints; floats are truncated as before
+            self._mouse_target = (int(x), int(y))
         self._want_attack = True
     
     # =========================================================
     # DASHES — One-shot actions, queued for this frame
     # =========================================================
     
+    # How long each tap of a dash is held down: more than one 60 Hz game frame, so the
+    # game's once-per-frame key poll sees the key down
+    DASH_TAP_HOLD = 0.02
+    # Gap between the two taps of a dash, long enough for the game to register a double-tap
+    DASH_TAP_GAP = 0.03
+    
+    # Dash steps, each sent on its own flush once the previous step's delay has elapsed
+    _DASH_DOWN1, _DASH_UP1, _DASH_DOWN2, _DASH_UP2 = 1, 2, 3, 4
+
     def dash_left(self):
         """Queue a dash left (double-tap A). Only one dash executes per frame."""
-        self._queued_dashes.append('left')
+        if self._next_dash is None:
+            self._next_dash = 'a'  # first dash of the frame wins
     
     def dash_right(self):
         """Queue a dash right (double-tap D). Only one dash executes per frame."""
-        self._queued_dashes.append('right')
+        if self._next_dash is None:
+            self._next_dash = 'd'  # first dash of the frame wins
     
     # =========================================================
     # ENGINE METHODS — Called by script_runner, NOT by scripts
@@ -98,71 +148,99 @@ class Actions:
         Called once per frame by script_runner AFTER run() returns.
         
         Order of operations:
-        1. Execute queued dashes (only blocking operation, ~55ms)
+        1. Advance the dash state machine (down, up, down, up, each on a later
+           frame than the one before, spaced by DASH_TAP_HOLD/DASH_TAP_GAP — never sleeps)
         2. Reconcile held keys with desired keys (press new, release old)
         3. Move mouse to target
         4. Handle mouse button (attack) state
         5. Clear per-frame intent
         """
         
-        # 1. Execute queued dashes (at most one per frame)
-        #    Dashes require a double-tap, which needs a small blocking gap.
-        #    This is the ONLY blocking operation in the entire system.
-        if self._queued_dashes:
-            direction = self._queued_dashes[0]  # Only first dash per frame
-            key = 'a' if direction == 'left' else 'd'
+        out = self._out
+        
+        # 1. Dashes are a double-tap split across frames: every down and up goes out on
+        #    its own flush, so the game polls each tap as held. The dash owns its key
+        #    until the last key-up, and dashes queued while one is in flight are dropped.
+        dash_key = self._dash_key
+        if dash_key is not None:
+            now = time.perf_counter()
+            if now >= self._dash_deadline:
+                phase = self._dash_phase
+                if phase == self._DASH_UP2:
+                    # Done; reconciliation re-presses the key from the next frame on
+                    # if the script still wants to move that way
+                    out.key_up(dash_key)
+                    self._dash_key = None
+                    self._dash_phase = 0
+                else:
+                    if phase == self._DASH_UP1:
+                        out.key_up(dash_key)
+                        self._dash_deadline = now + self.DASH_TAP_GAP
+                    else:
+                        out.key_down(dash_key)
+                        self._dash_deadline = now + self.DASH_TAP_HOLD
+                    self._dash_phase = phase + 1
+            self._desired_mask &= ~_KEY_BITS[dash_key]
+        elif self._next_dash is not None:
+            key = self._next_dash
+            bit = _KEY_BITS[key]
             
             # Release the key first if it's currently held (double-tap won't register otherwise)
-            if key in self._held_keys:
-                pydirectinput.keyUp(key)
-                self._held_keys.discard(key)
-            
-            # Double-tap: press, brief gap, press
-            pydirectinput.press(key)
-            time.sleep(0.03)  # Minimal gap for game to register as double-tap
-            pydirectinput.press(key)
-            # After press(), the key is released — reconciliation below will
-            # re-press it if the script also wants to move in that direction.
+            if self._held_mask & bit:
+                out.key_up(key)
+                self._held_mask &= ~bit
+                # The up must reach the game on an earlier poll than the first tap
+                self._dash_phase = self._DASH_DOWN1
+            else:
+                out.key_down(key)
+                self._dash_phase = self._DASH_UP1
+            self._dash_key = key
+            self._dash_deadline = time.perf_counter() + self.DASH_TAP_HOLD
+            self._desired_mask &= ~bit
         
         # 2. Reconcile movement keys
         #    Release keys no longer wanted, press newly wanted keys.
-        keys_to_release = self._held_keys - self._desired_keys
-        keys_to_press = self._desired_keys - self._held_keys
+        held, desired = self._held_mask, self._desired_mask
+        self._held_mask = desired
         
-        for key in keys_to_release:
-            pydirectinput.keyUp(key)
-        for key in keys_to_press:
-            pydirectinput.keyDown(key)
+        # 3. Move mouse to target position (skip no-op / sub-threshold moves)
+        target = self._mouse_target
+        if target is not None:
+            last = self._last_mouse_sent
+            if last is None or abs(target[0] - last[0]) + abs(target[1] - last[1]) >= self.mouse_move_threshold:
+                self._last_mouse_sent = target
+            else:
+                target = None
         
-        # Update held state to match desired
-        self._held_keys = set(self._desired_keys)
+        # 4. Handle mouse button state (attack): +1 press, -1 release, 0 unchanged
+        button = self._want_attack - self._mouse_is_down
+        self._mouse_is_down = self._want_attack
         
-        # 3. Move mouse to target position
-        if self._mouse_target:
-            pydirectinput.moveTo(self._mouse_target[0], self._mouse_target[1])
-        
-        # 4. Handle mouse button state (attack)
-        if self._want_attack and not self._mouse_is_down:
-            pydirectinput.mouseDown()
-            self._mouse_is_down = True
-        elif not self._want_attack and self._mouse_is_down:
-            pydirectinput.mouseUp()
-            self._mouse_is_down = False
+        # Steps 2-4 (plus any dash tap queued above) go out in one submission
+        release_keys, press_keys = _TRANSITIONS[held << _KEY_SHIFT | desired]
+        out.flush_frame(release_keys, press_keys, target, button)
         
         # 5. Reset per-frame intent for next frame
-        self._desired_keys.clear()
+        self._desired_mask = 0
         self._mouse_target = None
         self._want_attack = False
-        self._queued_dashes.clear()
+        self._next_dash = None
     
     def release_all(self):
-        """Release all held keys and mouse button. Called on shutdown."""
-        for key in self._held_keys:
-            pydirectinput.keyUp(key)
-        if self._mouse_is_down:
-            pydirectinput.mouseUp()
-            self._mouse_is_down = False
-        self._held_keys.clear()
+        """Release all held keys and mouse button. Called on shutdown or error recovery.
+        
+        Goes through the same single-submission path as flush(): every key-up and
+        the mouse-up leave in one SendInput call.
+        """
+        if self._dash_phase in (self._DASH_UP1, self._DASH_UP2):
+            # A dash tap is physically down; queued ahead of the batch below
+            self._out.key_up(self._dash_key)
+        self._out.flush_frame(_MASK_KEYS[self._held_mask], (), None, -1 if self._mouse_is_down else 0)
+        self._mouse_is_down = False
+        self._held_mask = 0
+        self._last_mouse_sent = None
+        self._dash_key = None
+        self._dash_phase = 0
 
 
 # Global instance
@@ -8,8 +8,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import json
+import logging
 import re
 import time
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pydirectinput
 
 from orchestrator import Orchestrator
@@ -55,6 +59,20 @@ underground space below the surface.
 """
 
 
+logger = logging.getLogger("agent")
+
+# Separator lines for run() progress output, built once
+_SEP60 = "=" * 60
+_SEP40 = "─" * 40
+
+# Most recent subtask records kept in a run's history (older ones are dropped)
+_HISTORY_MAXLEN = 256
+
+# Goal parsing / tool registration patterns, compiled once
+_COMBAT_RE = re.compile(r"defeat|fight|kill|boss|battle|combat|slay", re.IGNORECASE)
+_ENEMY_RE = re.compile(r'(?:defeat|fight|kill|battle|slay)\s+(?:the\s+)?(.+)', re.IGNORECASE)
+
+
 class GameAgent:
     """
     Complete game-playing agent.
@@ -77,11 +95,15 @@ class GameAgent:
         self.orchestrator = Orchestrator(model=pro_model)
         self.executor = Executor(model=flash_model)
         self.pro_model = pro_model
+        # Lazily imported on first use (keeps cold start light), then bound here
+        self._capture_screenshot = None
+        self._screenshot_mime = None
+        self._CombatLearner = None
+        self._tool_code_cache = {}  # tool source -> compiled code object (regenerated tools skip recompiling)
     
     def _is_combat_task(self, goal: str) -> bool:
         """Check if a goal requires the real-time combat system."""
-        combat_keywords = ["defeat", "fight", "kill", "boss", "battle", "combat", "slay"]
-        return any(kw in goal.lower() for kw in combat_keywords)
+        return _COMBAT_RE.search(goal) is not None
     
     def _extract_enemy_name(self, goal: str) -> str:
         """Try to extract an enemy name from the goal string.
@@ -90,7 +112,7 @@ class GameAgent:
         Falls back to the full goal string if no pattern matches.
         """
         # Try to find "defeat/fight/kill the <enemy name>"
-        match = re.search(r'(?:defeat|fight|kill|battle|slay)\s+(?:the\s+)?(.+)', goal, re.IGNORECASE)
+        match = _ENEMY_RE.search(goal)
         if match:
             return match.group(1).strip()
         return goal
@@ -112,19 +134,21 @@ class GameAgent:
         Returns:
             Dictionary with final status and history of attempts.
         """
-        print(f"\n{'='*60}")
-        print(f"GOAL: {goal}")
-        print(f"{'='*60}\n")
+        logger.info("\n%s", _SEP60)
+        logger.info("GOAL: %s", goal)
+        logger.info("%s\n", _SEP60)
         
         # Route combat tasks to the CombatLearner
         if self._is_combat_task(goal) and enemy_video:
-            from combat_learner import CombatLearner
+            if self._CombatLearner is None:
+                from combat_learner import CombatLearner
+                self._CombatLearner = CombatLearner
             
             resolved_name = enemy_name or self._extract_enemy_name(goal)
-            print(f"[AGENT] Combat task detected. Enemy: {resolved_name}")
-            print(f"[AGENT] Routing to CombatLearner...\n")
+            logger.info("[AGENT] Combat task detected. Enemy: %s", resolved_name)
+            logger.info("[AGENT] Routing to CombatLearner...\n")
             
-            learner = CombatLearner(model=self.pro_model)
+            learner = self._CombatLearner(model=self.pro_model)
             return learner.learn_to_fight(
                 enemy_name=resolved_name,
                 enemy_video_path=enemy_video,
@@ -134,21 +158,25 @@ class GameAgent:
         # --- General task flow (existing Orchestrator + Executor) ---
         
         # Step 1: Capture current game state and plan
-        print("[ORCHESTRATOR] Capturing current game state...")
-        from screenshot import capture_screenshot
-        planning_screenshot = capture_screenshot()
-        print(f"[ORCHESTRATOR] Screenshot captured: {len(planning_screenshot)//1024}KB")
+        logger.info("[ORCHESTRATOR] Capturing current game state...")
+        if self._capture_screenshot is None:
+            from screenshot import SCREENSHOT_MIME, capture_screenshot
+            self._capture_screenshot = capture_screenshot
+            self._screenshot_mime = SCREENSHOT_MIME
+        planning_screenshot = self._capture_screenshot()
+        logger.info("[ORCHESTRATOR] Screenshot captured: %dKB", len(planning_screenshot) >> 10)
         
-        print("[ORCHESTRATOR] Planning goal...")
-        plan = self.orchestrator.plan(goal, game_context, screenshot=planning_screenshot)
+        logger.info("[ORCHESTRATOR] Planning goal...")
+        plan = self.orchestrator.plan(goal, game_context, screenshot=planning_screenshot,
+                                      screenshot_mime=self._screenshot_mime)
         
         if "error" in plan:
-            print(f"[ERROR] Failed to create plan: {plan}")
+            logger.error("[ERROR] Failed to create plan: %s", plan)
             return {"status": "failed", "error": "Planning failed", "plan": plan}
         
-        print(f"[ORCHESTRATOR] Created {len(plan.get('subtasks', []))} subtasks:")
+        logger.info("[ORCHESTRATOR] Created %d subtasks:", len(plan.get('subtasks', [])))
         for st in plan.get("subtasks", []):
-            print(f"  {st['id']}. {st['description']}")
+            logger.info("  %s. %s", st['id'], st['description'])
         
         # Context search disabled - using user-provided game_context instead
         # The google_search was returning "I can't access your game" responses
@@ -161,91 +189,113 @@ class GameAgent:
         #     print(f"[CONTEXT] {context[:200]}...")
         
         # Step 2: Execute each subtask
-        history = []
+        # Bounded, and records drop the heavy final_video/videos fields
+        history = deque(maxlen=_HISTORY_MAXLEN)
+        successful = 0
+        total = 0
+        # Failure diagnoses only inform the log, so they run in the background while
+        # the next subtask executes; (subtask, future) pairs are reported at the end
+        diagnosis_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="diagnosis")
+        pending_diagnoses = []
         
-        for subtask in plan.get("subtasks", []):
-            print(f"\n{'─'*40}")
-            print(f"[SUBTASK {subtask['id']}] {subtask['description']}")
-            print(f"[CRITERIA] {subtask['success_criteria']}")
-            print(f"{'─'*40}")
+        try:
+            for subtask in plan.get("subtasks", []):
+                logger.info("\n%s", _SEP40)
+                logger.info("[SUBTASK %s] %s", subtask['id'], subtask['description'])
+                logger.info("[CRITERIA] %s", subtask['success_criteria'])
+                logger.info("%s", _SEP40)
             
-            # Register any new tools needed
-            for tool_name in subtask.get("tools_needed", []):
-                if tool_name not in self.executor.tool_registry:
-                    print(f"[ORCHESTRATOR] Creating new tool: {tool_name}")
-                    tool_code = self.orchestrator.request_tool(
-                        f"A tool called '{tool_name}' for game automation"
-                    )
-                    self._register_dynamic_tool(tool_name, tool_code)
+                # Register any new tools needed
+                for tool_name in subtask.get("tools_needed", []):
+                    if tool_name not in self.executor.tool_registry:
+                        logger.info("[ORCHESTRATOR] Creating new tool: %s", tool_name)
+                        tool_code = self.orchestrator.request_tool(
+                            f"A tool called '{tool_name}' for game automation"
+                        )
+                        self._register_dynamic_tool(tool_name, tool_code)
             
-            # Attempt the subtask
-            print(f"\n[EXECUTOR] Attempting subtask...")
-            result = self.executor.attempt_subtask(subtask)
+                # Attempt the subtask
+                logger.info("\n[EXECUTOR] Attempting subtask...")
+                result = self.executor.attempt_subtask(subtask)
             
-            history.append({
-                "subtask": subtask,
-                "result": result
-            })
+                total += 1
+                # Keep only a slim record without video bytes ("videos" holds the same clip as
+                # final_video); diagnosis below still reads final_video from `result`
+                history.append({
+                    "subtask": subtask,
+                    "result": {k: v for k, v in result.items() if k not in ("final_video", "videos")},
+                })
             
-            print(f"[EXECUTOR] Status: {result['status']}")
-            print(f"[EXECUTOR] Attempts: {result['attempts']}")
+                logger.info("[EXECUTOR] Status: %s", result['status'])
+                logger.info("[EXECUTOR] Attempts: %s", result['attempts'])
             
-            # Handle result
-            if result["status"] == "done":
-                print(f"[SUCCESS] Subtask completed!")
-                continue
+                # Handle result
+                if result["status"] == "done":
+                    successful += 1
+                    logger.info("[SUCCESS] Subtask completed!")
+                    continue
             
-            elif result["status"] == "stuck":
-                print(f"[STUCK] {result['message']}")
+                elif result["status"] == "stuck":
+                    logger.info("[STUCK] %s", result['message'])
                 
-                # Pro diagnoses the failure
-                if result.get("final_video"):
-                    print(f"\n[ORCHESTRATOR] Diagnosing failure...")
-                    diagnosis = self.orchestrator.diagnose_failure(
-                        subtask,
-                        result["final_video"],
-                        result["message"]
-                    )
-                    print(f"[DIAGNOSIS] {diagnosis.get('diagnosis', 'Unknown')}")
-                    
-                    if diagnosis.get("needs_new_tool"):
-                        print(f"[ORCHESTRATOR] Creating new tool: {diagnosis['new_tool_description']}")
-                        # Would create and retry here
-                    
-                    if diagnosis.get("retry_with_modifications"):
-                        print(f"[ORCHESTRATOR] Suggested retry: {diagnosis['retry_with_modifications']}")
-                        # Would retry with modifications here
+                    # Pro diagnoses the failure (in the background)
+                    if result.get("final_video"):
+                        logger.info("\n[ORCHESTRATOR] Diagnosing failure in the background...")
+                        pending_diagnoses.append((subtask, diagnosis_pool.submit(
+                            self.orchestrator.diagnose_failure,
+                            subtask,
+                            result["final_video"],
+                            result["message"]
+                        )))
                 
-                # For now, continue to next subtask
-                print("[AGENT] Moving to next subtask...")
+                    # For now, continue to next subtask
+                    logger.info("[AGENT] Moving to next subtask...")
             
-            elif result["status"] == "max_attempts":
-                print(f"[FAILED] Max attempts reached")
-                print("[AGENT] Moving to next subtask...")
+                elif result["status"] == "max_attempts":
+                    logger.info("[FAILED] Max attempts reached")
+                    logger.info("[AGENT] Moving to next subtask...")
+        
+            for subtask, future in pending_diagnoses:
+                try:
+                    diagnosis = future.result()
+                except Exception as e:
+                    logger.error("[ERROR] Diagnosis of subtask %s failed: %s", subtask.get('id'), e)
+                    continue
+                self._report_diagnosis(subtask, diagnosis)
+        finally:
+            # Also on an exception: queued diagnoses are dropped, a running one is waited for
+            diagnosis_pool.shutdown(cancel_futures=True)
         
         # Final summary
-        print(f"\n{'='*60}")
-        print("AGENT RUN COMPLETE")
-        print(f"{'='*60}")
+        logger.info("\n%s", _SEP60)
+        logger.info("AGENT RUN COMPLETE")
+        logger.info("%s", _SEP60)
         
-        successful = sum(1 for h in history if h["result"]["status"] == "done")
-        total = len(history)
-        print(f"Completed: {successful}/{total} subtasks")
+        logger.info("Completed: %d/%d subtasks", successful, total)
         
         return {
             "status": "completed" if successful == total else "partial",
             "successful_subtasks": successful,
             "total_subtasks": total,
-            "history": history
+            "history": list(history)
         }
     
+    def _report_diagnosis(self, subtask: dict, diagnosis: dict):
+        """Log the orchestrator's diagnosis of a stuck subtask."""
+        logger.info("[DIAGNOSIS] Subtask %s: %s", subtask.get('id'), diagnosis.get('diagnosis', 'Unknown'))
+        
+        if diagnosis.get("needs_new_tool"):
+            logger.info("[ORCHESTRATOR] Creating new tool: %s", diagnosis['new_tool_description'])
+            # Would create and retry here
+        
+        if diagnosis.get("retry_with_modifications"):
+            logger.info("[ORCHESTRATOR] Suggested retry: %s", diagnosis['retry_with_modifications'])
+            # Would retry with modifications here
+    
     def _register_dynamic_tool(self, name: str, code: str):
         """Register a dynamically created tool."""
         # DEBUG: Print the generated code
-        print(f"\n[DEBUG] Generated code for '{name}':")
-        print("─" * 40)
-        print(code)
-        print("─" * 40)
+        logger.debug("\n[DEBUG] Generated code for '%s':\n%s\n%s\n%s", name, _SEP40, code, _SEP40)
         
         namespace = {
             'pydirectinput': pydirectinput,
@@ -253,22 +303,28 @@ class GameAgent:
         }
         
         try:
-            exec(code, namespace)
+            code_obj = self._tool_code_cache.get(code)
+            if code_obj is None:
+                code_obj = compile(code, f"<tool:{name}>", "exec")
+                self._tool_code_cache[code] = code_obj
+            exec(code_obj, namespace)
             
-            # Extract function name from code
-            func_match = re.search(r"def\s+([a-zA-Z_]\w*)\s*\(", code)
-            if func_match:
-                actual_name = func_match.group(1)
-                self.executor.register_tool(name, namespace[actual_name])
-                print(f"[TOOLS] Registered: {name}")
+            # The tool is the first function the code defined (namespace keeps definition order)
+            func = next((v for k, v in namespace.items()
+                         if k not in ('pydirectinput', 'time') and isinstance(v, types.FunctionType)), None)
+            if func is not None:
+                self.executor.register_tool(name, func)
+                logger.info("[TOOLS] Registered: %s", name)
             else:
-                print(f"[ERROR] Could not parse function from code")
+                logger.error("[ERROR] Could not parse function from code")
         except Exception as e:
-            print(f"[ERROR] Failed to register tool: {e}")
+            logger.error("[ERROR] Failed to register tool: %s", e)
 
 
 if __name__ == "__main__":
     import argparse
+    import sys
+    import threading
     
     load_dotenv()
     
@@ -292,6 +348,14 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    # Progress output from GameAgent.run goes through the "agent" logger; show its INFO
+    # plainly without configuring the root logger (which would surface httpx/genai INFO too)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
     print("=" * 60)
     print("GAME AGENT")
     print("=" * 60)
@@ -301,9 +365,21 @@ if __name__ == "__main__":
     print("\nMake sure your game is open and focused!")
     
     input("\nPress Enter when ready to start...")
-    time.sleep(2)  # Give time to focus game window
     
-    agent = GameAgent()
+    # Build the agent (LLM clients) while the user focuses the game window
+    agent_box = []
+    def _build_agent():
+        try:
+            agent_box.append(GameAgent())
+        except BaseException as e:
+            agent_box.append(e)
+    builder = threading.Thread(target=_build_agent, daemon=True)
+    builder.start()
+    time.sleep(2)  # Give time to focus game window
+    builder.join()
+    if isinstance(agent_box[0], BaseException):
+        raise agent_box[0]
+    agent = agent_box[0]
     
     # Use provided context, or fall back to Terraria context for general tasks
     context = args.context or (TERRARIA_CONTEXT if not args.video else "")
@@ -17,12 +17,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import argparse
+import hashlib
 import importlib.util
+import json
 import os
 import re
 import tempfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from google import genai
 from google.genai import types
@@ -30,11 +33,146 @@ from google.genai import types
 from game_state import game_state
 from actions import actions
 from screen_recorder import ScreenRecorder
-from script_runner import load_script_from_path, run_script_timed
+from script_runner import load_script_from_code, run_script_timed
 from tracker_service import create_tracker_from_extraction_dir
 from static_element_extraction_pipeline import run_pipeline as run_extraction_pipeline
 
 
+# Patterns used on every learn/fight/parse call, compiled once
+_SAFE_NAME_RE = re.compile(r'[^\w\-]')
+_SAFE_KW_RE = re.compile(r'[^\w]')
+_PY_BLOCK_RE = re.compile(r'```python\s*\n(.*?)```', re.DOTALL)
+_ANY_BLOCK_RE = re.compile(r'```\s*\n(.*?)```', re.DOTALL)
+# Verdict check without upper-casing a copy of the whole response
+_WIN_RE = re.compile(r'RESULT:\s*WIN', re.IGNORECASE)
+# Appended to the analysis request when the attempt's run() never returned
+_OVERRUN_NOTE = ("\n\nNote: the script's run() did not return within 3s after the fight ended, "
+                 "so this attempt counts as a LOSS. run() must never block or loop; it is called every frame.")
+
+_HASH_CHUNK = 8 * 1024 * 1024
+
+# Tracker settings for fights (also used when main() pre-builds the tracker)
+_TRACKER_KWARGS = {"confidence": 0.85, "downscale_factor": 0.5, "skip_full_scan": True}
+
+
+def _sha256_file(path: str) -> str:
+    """Hex sha256 of a file, read in 8 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _drain(iterator):
+    """Consume the rest of an iterator (finishes a streamed chat reply)."""
+    for _ in iterator:
+        pass
+
+
+def _write_json_atomic(path: str, data):
+    """Write JSON next to `path` and rename it into place so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Combat-script system prompt; only the enemy name and optional kit section vary
+_PROMPT_TEMPLATE = """
+You are a game AI script writer. Your task is to write a Python combat script that defeats the %(enemy_name)s based on video footage you've analyzed.
+
+## GAME STATE
+
+You have access to a `game_state` object with real-time enemy positions:
+- `game_state.get_found_entities()` returns a dict of visible enemies: {"enemy_name": {"x": 800, "y": 400, "found": True}}
+- The PLAYER is ALWAYS at the CENTER of the screen (x=1280, y=720 on a 2560x1440 display)
+- Enemy coordinates are in screen pixels, updated every frame (~30 FPS)
+
+## HOW ACTIONS WORK (IMPORTANT)
+
+All actions are **non-blocking intent declarations**. Your `run()` function is called every frame.
+You declare what you want to happen THIS frame by calling action methods. After `run()` returns,
+the engine applies everything in a single pass (~5-15ms total). This means:
+
+- You can call AS MANY actions as you want per frame with NO performance penalty
+- Actions do NOT have duration parameters — they apply for exactly one frame
+- To keep moving left, call `actions.move_left()` every frame
+- To stop moving, simply stop calling the method — the key is auto-released next frame
+- Mouse attack is held while you keep calling `attack_at()` — released when you stop
+
+## AVAILABLE ACTIONS
+
+Movement (call each frame you want the key held):
+- actions.move_left()  — Hold left (A key) this frame
+- actions.move_right() — Hold right (D key) this frame
+- actions.fly_up()     — Hold fly/jump (Space key) this frame
+- actions.move_down()  — Hold down (S key) this frame
+
+Dashes (one-shot, queued):
+- actions.dash_left()  — Dash left (double-tap A). One dash per frame max
+- actions.dash_right() — Dash right (double-tap D). One dash per frame max
+
+Combat:
+- actions.attack_at(x, y) — Aim mouse at (x, y) and hold attack this frame
+%(context_section)s
+## YOUR TASK
+
+Based on the enemy video footage you've seen, write a Python script that defeats the enemy, avoiding being hit while also attacking it.
+
+## SCRIPT FORMAT
+
+Your script must have this structure:
+
+```python
+\"\"\"
+Combat script: %(enemy_name)s
+Strategy: [Brief description of your approach]
+\"\"\"
+
+# Configuration
+PLAYER_X = 1280  # Player always at screen center
+PLAYER_Y = 720
+
+def run(game_state, actions):
+    '''Called every frame. Declare all actions for this frame.'''
+    enemies = game_state.get_found_entities()
+    # Your combat logic here
+```
+
+## Here's an example script:
+
+```python
+SCREEN_CENTER_X = 1280
+
+def run(game_state, actions):
+    entities = game_state.get_found_entities()
+    if not entities:
+        return
+    for name, entity in entities.items():
+        x, y = entity["x"], entity["y"]
+        if x < SCREEN_CENTER_X:
+            actions.move_right()
+        else:
+            actions.move_left()
+        actions.attack_at(x, y)
+        break
+```
+
+### Keep in mind 
+- All actions are non-blocking. Call multiple actions per frame freely (e.g. move + attack + fly simultaneously)
+- Enemy will not always be on your screen when attacking you, so continue to attack their last known location
+- Enemy's name will always be lower case
+- There is an infinite horizontal platform
+- Constantly holding the movement key in the opposite direction of the enemy is highly advised
+- When the enemy gets too close, dashing into them will make it so you dont take any damage
+"""
+
+
 class CombatLearner:
     """
     Automated combat learning system.
@@ -44,8 +182,9 @@ class CombatLearner:
     out what went wrong, and writes a better strategy each time.
     """
     
-    def __init__(self, model: str = "gemini-3-pro-preview"):
-        self.client = genai.Client()
+    def __init__(self, model: str = "gemini-3-pro-preview", client: genai.Client = None):
+        # A client built ahead of time (e.g. while main() parses args) skips the handshake here
+        self.client = client if client is not None else genai.Client()
         self.model = model
         
         # How long the boss must be gone before we consider the fight over
@@ -56,12 +195,35 @@ class CombatLearner:
         self.fight_fps = 30
         # FPS for screen recording (sent to Gemini for analysis)
         self.recording_fps = 10
+        # Resize factor for fight recordings (0.5: 2560x1440 -> 1280x720) before upload
+        self.recording_scale = 0.5
+        # Write every attempt's script to disk, not just the winning/final one
+        self.keep_losing_scripts = False
+        # One recorder for every attempt of a learn_to_fight run (its capture thread and
+        # mss handle stay warm); built per run from recording_fps/recording_scale
+        self.recorder = None
+        
+        # Shared worker pool for a learn_to_fight run: Gemini uploads and stream drains
+        # (created per run, shut down when it ends)
+        self._executor = None
+        # Background drain of the previous streamed reply (see _send_streaming)
+        self._stream_tail = None
         
         # Paths
         self.base_dir = os.path.dirname(__file__)
         self.scripts_dir = os.path.join(self.base_dir, "test_scripts")
         self.videos_dir = os.path.join(self.scripts_dir, "fightvideos")
         self.extraction_dir = os.path.join(self.base_dir, "extraction_stuff")
+        # sha256 of a reference video -> Gemini file it was uploaded as (reused across runs)
+        self._upload_cache_path = os.path.join(self.base_dir, ".gemini_upload_cache.json")
+        
+        # Last script used, so an unchanged script is not rewritten
+        self._last_script_hash = None
+        self._last_script_path = None
+        self._last_script_saved = False
+        
+        # Formatted system prompts keyed by (enemy_name, enemy_context)
+        self._prompt_cache = {}
         
         os.makedirs(self.videos_dir, exist_ok=True)
     
@@ -75,6 +237,7 @@ class CombatLearner:
         enemy_video_path: str,
         max_attempts: int = 10,
         enemy_context: str = "",
+        tracker=None,
     ) -> dict:
         """
         Full automated pipeline: extract sprite, track enemy, generate scripts,
@@ -85,6 +248,8 @@ class CombatLearner:
             enemy_video_path: Path to a video showing the enemy in action
             max_attempts: Max fight attempts before giving up
             enemy_context: Extra context about player kit, weapons, etc.
+            tracker: Optional pre-built (not yet started) TrackerService for
+                extraction_dir; ignored if a new reference crop has to be extracted.
         
         Returns:
             Dict with status, winning_script (if won), attempt count, and history.
@@ -96,34 +261,36 @@ class CombatLearner:
         print(f"{'='*60}\n")
         
         # Sanitized name for file paths (e.g. "empress_of_light")
-        safe_name = re.sub(r'[^\w\-]', '_', enemy_name).lower()
+        safe_name = _SAFE_NAME_RE.sub('_', enemy_name).lower()
         # Keyword to match in game_state entity names (lowercase)
         enemy_keyword = enemy_name.split()[0].lower()  # e.g. "empress"
         
-        tracker = None
+        prebuilt_tracker, tracker = tracker, None
         history = []
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="combat-learner")
+        self.recorder = ScreenRecorder(fps=self.recording_fps, scale=self.recording_scale)
         
         try:
             # --- Phase 1: Ensure we have a reference sprite for tracking ---
             reference_path = os.path.join(self.extraction_dir, safe_name, "reference_crop.png")
             
-            if os.path.exists(reference_path):
+            # The crop is reused only if it was extracted from this same video
+            if os.path.exists(reference_path) and self._extraction_is_current(reference_path, enemy_video_path):
                 print(f"[EXTRACT] Reference crop already exists: {reference_path}")
             else:
-                print(f"[EXTRACT] No reference crop found. Running extraction pipeline...")
+                print(f"[EXTRACT] No up-to-date reference crop found. Running extraction pipeline...")
                 result = run_extraction_pipeline(enemy_video_path, enemy_name)
                 if result is None:
                     return {"status": "failed", "error": "Extraction pipeline failed to produce a reference crop", "attempts": 0, "history": []}
                 reference_path = result
+                self._write_extraction_meta(reference_path, enemy_video_path)
                 print(f"[EXTRACT] Reference crop saved: {reference_path}")
+                prebuilt_tracker = None  # Built before this crop existed
             
             # --- Phase 2: Start the tracker service ---
             print(f"\n[TRACKER] Starting real-time tracker...")
-            tracker = create_tracker_from_extraction_dir(
-                extraction_dir=self.extraction_dir,
-                confidence=0.85,
-                downscale_factor=0.5,
-                skip_full_scan=True,
+            tracker = prebuilt_tracker or create_tracker_from_extraction_dir(
+                extraction_dir=self.extraction_dir, **_TRACKER_KWARGS
             )
             tracker.start()
             time.sleep(0.5)  # Let the tracker warm up
@@ -138,10 +305,10 @@ class CombatLearner:
             
             # --- Phase 4: Generate the initial combat script ---
             print(f"\n[GEMINI] Uploading enemy analysis video...")
-            video_file = self._upload_video(enemy_video_path)
+            video_file = self._upload_video(enemy_video_path, reuse=True)
             
             print(f"[GEMINI] Requesting initial combat script...")
-            response = chat.send_message([
+            _, script_code = self._send_streaming(chat, [
                 types.Part(
                     file_data=types.FileData(file_uri=video_file.uri),
                     video_metadata=types.VideoMetadata(fps=20)
@@ -150,7 +317,6 @@ class CombatLearner:
                 f"then write a combat script to defeat it."
             ])
             
-            script_code = self._parse_script(response.text)
             if script_code is None:
                 return {"status": "failed", "error": "Gemini did not return a valid script", "attempts": 0, "history": []}
             
@@ -162,14 +328,27 @@ class CombatLearner:
                 print(f"ATTEMPT {attempt}/{max_attempts}")
                 print(f"{'='*60}")
                 
-                # Save the script to disk
-                script_path = os.path.join(self.scripts_dir, f"{safe_name}_attempt_{attempt}.py")
-                with open(script_path, "w") as f:
-                    f.write(script_code)
-                print(f"[SCRIPT] Saved: {script_path}")
+                # New script path, unless it's the same code as last attempt
+                # (Gemini's improved script didn't parse and we're reusing the previous one)
+                script_hash = hashlib.blake2b(script_code.encode()).digest()
+                if script_hash == self._last_script_hash:
+                    script_path = self._last_script_path
+                    print(f"[SCRIPT] Unchanged, reusing: {script_path}")
+                else:
+                    script_path = os.path.join(self.scripts_dir, f"{safe_name}_attempt_{attempt}.py")
+                    self._last_script_hash = script_hash
+                    self._last_script_path = script_path
+                    self._last_script_saved = False
                 
-                # Hot-reload the script module
-                script_module = load_script_from_path(script_path)
+                # Scripts run from memory; only keep losing ones on disk when asked to
+                # (the last attempt's is always saved, a winner is saved below)
+                if self.keep_losing_scripts or attempt == max_attempts:
+                    self._save_script(script_path, script_code)
+                
+                # Hot-reload straight from the code (compiled once per distinct script)
+                script_module = load_script_from_code(
+                    script_code, f"script_{safe_name}_attempt_{attempt}", script_path
+                )
                 print(f"[SCRIPT] Loaded module: {script_module.__name__}")
                 
                 # Run the fight and record it
@@ -180,14 +359,15 @@ class CombatLearner:
                 fight_duration = fight_result.get("duration", 0)
                 print(f"[FIGHT] Fight ended after {fight_duration:.1f}s")
                 
-                # Record attempt in history
+                # Record attempt in history (script_path only if the script is on disk)
                 attempt_record = {
                     "attempt": attempt,
-                    "script_path": script_path,
+                    "script_path": script_path if self._last_script_saved else None,
                     "video_path": fight_video_path,
                     "duration": fight_duration,
                     "analysis": None,
                     "won": False,
+                    "script_overrun": fight_result.get("script_overrun", False),
                 }
                 
                 if fight_video_path is None:
@@ -197,11 +377,11 @@ class CombatLearner:
                     continue
                 
                 # --- Upload fight video and get analysis + improved script ---
-                print(f"\n[GEMINI] Uploading fight recording ({fight_duration:.1f}s)...")
-                fight_file = self._upload_video(fight_video_path)
+                print(f"\n[GEMINI] Waiting for fight recording upload ({fight_duration:.1f}s)...")
+                fight_file = fight_result["upload_future"].result()
                 
                 print(f"[GEMINI] Requesting analysis and improved script...")
-                response = chat.send_message([
+                response_text, new_script = self._send_streaming(chat, [
                     types.Part(
                         file_data=types.FileData(file_uri=fight_file.uri),
                         video_metadata=types.VideoMetadata(fps=20)
@@ -211,13 +391,14 @@ class CombatLearner:
                     "   Start your response with exactly 'RESULT: WIN' or 'RESULT: LOSE'.\n\n"
                     "2. Analyze what went wrong (or right) and explain your reasoning.\n\n"
                     "3. Write an improved combat script incorporating your analysis."
+                    + (_OVERRUN_NOTE if attempt_record["script_overrun"] else "")
                 ])
                 
-                response_text = response.text
                 print(f"[GEMINI] Response received ({len(response_text)} chars)")
                 
                 # Check win/loss
-                won = "RESULT: WIN" in response_text.upper()
+                # A script whose run() blocked fails the attempt whatever the recording shows
+                won = _WIN_RE.search(response_text) is not None and not attempt_record["script_overrun"]
                 attempt_record["won"] = won
                 attempt_record["analysis"] = response_text[:500]  # Truncate for storage
                 history.append(attempt_record)
@@ -226,6 +407,8 @@ class CombatLearner:
                     print(f"\n{'='*60}")
                     print(f"VICTORY on attempt {attempt}!")
                     print(f"{'='*60}")
+                    self._save_script(script_path, script_code)
+                    attempt_record["script_path"] = script_path
                     return {
                         "status": "victory",
                         "attempts": attempt,
@@ -234,8 +417,7 @@ class CombatLearner:
                         "history": history,
                     }
                 
-                # Parse improved script for next attempt
-                new_script = self._parse_script(response_text)
+                # Improved script for next attempt (parsed while streaming)
                 if new_script is None:
                     print(f"[GEMINI] Could not parse improved script, reusing previous script")
                 else:
@@ -243,7 +425,7 @@ class CombatLearner:
                     print(f"[GEMINI] Improved script received ({len(script_code)} chars)")
                 
                 # Brief log of Gemini's analysis
-                analysis_preview = response_text[:300].replace('\n', ' ')
+                analysis_preview = attempt_record["analysis"][:300].replace('\n', ' ')
                 print(f"[ANALYSIS] {analysis_preview}...")
             
             # Max attempts exhausted
@@ -257,12 +439,56 @@ class CombatLearner:
             }
         
         finally:
-            # Always clean up tracker and release keys
+            # Always clean up tracker, recorder and keys; drop any upload nobody waited on
             actions.release_all()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self.recorder.close()
             if tracker:
                 tracker.stop()
                 print("[TRACKER] Stopped")
     
+    # =========================================================
+    # EXTRACTION CACHE
+    # =========================================================
+    
+    @staticmethod
+    def _extraction_is_current(reference_path: str, video_path: str) -> bool:
+        """
+        Check the crop's sidecar meta against the source video.
+        
+        Same size and mtime is trusted as-is (like .pyc validation); otherwise the
+        video is hashed and compared. A crop without meta predates this check and is
+        adopted for the current video.
+        """
+        meta_path = reference_path + ".meta.json"
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            CombatLearner._write_extraction_meta(reference_path, video_path)
+            return True
+        except (OSError, ValueError):
+            return False
+        
+        st = os.stat(video_path)
+        if meta.get("size") == st.st_size and meta.get("mtime") == st.st_mtime:
+            return True
+        if meta.get("sha256") != _sha256_file(video_path):
+            return False
+        # Touched but unchanged: refresh the fast-path fields
+        CombatLearner._write_extraction_meta(reference_path, video_path, meta["sha256"])
+        return True
+    
+    @staticmethod
+    def _write_extraction_meta(reference_path: str, video_path: str, sha256: str = None):
+        st = os.stat(video_path)
+        _write_json_atomic(reference_path + ".meta.json", {
+            "video": os.path.abspath(video_path),
+            "sha256": sha256 or _sha256_file(video_path),
+            "mtime": st.st_mtime,
+            "size": st.st_size,
+        })
+    
     # =========================================================
     # FIGHT EXECUTION
     # =========================================================
@@ -282,7 +508,9 @@ class CombatLearner:
             enemy_keyword: Lowercase keyword to match entity names (e.g. "empress")
         
         Returns:
-            Dict with video_path (str or None) and duration (float).
+            Dict with video_path (str or None), duration (float), upload_future
+            (Future resolving to the uploaded Gemini file, or None without a video) and
+            script_overrun (True if run() was still running 3s after the fight ended).
         """
         # Step 1: Wait for the boss to appear
         print(f"  Waiting for boss ('{enemy_keyword}') to appear in game state...")
@@ -295,96 +523,193 @@ class CombatLearner:
         print(f"  Boss detected! Starting fight...")
         
         # Step 2: Start recording + script execution
-        recorder = ScreenRecorder(fps=self.recording_fps)
-        recorder.start()
+        # The recorder encodes straight into video_path (Gemini Files API needs a file path)
+        safe_keyword = _SAFE_KW_RE.sub('_', enemy_keyword)
+        video_path = os.path.join(
+            self.videos_dir,
+            f"{safe_keyword}_attempt_{int(time.time())}.mp4"
+        )
+        recorder = self.recorder
+        recorder.start(output_path=video_path)
         
         stop_event = threading.Event()
         
-        # Run the script in a background thread so we can monitor boss state
-        script_thread = threading.Thread(
-            target=run_script_timed,
-            args=(script_module, stop_event),
-            kwargs={"fps": self.fight_fps, "verbose": True},
-            daemon=True,
-        )
+        # Run the script on a daemon thread so we can monitor boss state; not a pool
+        # worker, so a run() that never returns can't keep the process alive at exit
+        script_errors = []
+        
+        def _run_script():
+            try:
+                run_script_timed(script_module, stop_event, fps=self.fight_fps, verbose=True)
+            except Exception as e:
+                script_errors.append(e)
+        
+        script_thread = threading.Thread(target=_run_script, name="combat-script", daemon=True)
         script_thread.start()
         
         fight_start = time.time()
         
         # Step 3: Monitor for fight end (boss gone for N seconds)
+        # Woken by game_state whenever an entity appears/disappears, so no polling
         boss_last_seen = time.time()
+        changed = game_state.entities_changed
         
-        while not stop_event.is_set():
-            time.sleep(0.5)  # Poll every 500ms
-            
-            elapsed = time.time() - fight_start
-            
-            # Check if boss is still visible
-            entities = game_state.get_found_entities()
-            boss_visible = any(enemy_keyword in name.lower() for name in entities.keys())
-            
-            if boss_visible:
-                boss_last_seen = time.time()
-            
-            # Boss gone for threshold seconds → fight over
-            boss_gone_for = time.time() - boss_last_seen
-            if boss_gone_for >= self.boss_gone_threshold:
-                print(f"  Boss not seen for {self.boss_gone_threshold}s — fight over.")
-                stop_event.set()
-                break
-            
-            # Hard timeout
-            if elapsed >= self.fight_timeout:
-                print(f"  Hard timeout ({self.fight_timeout}s) reached — stopping fight.")
-                stop_event.set()
-                break
+        with changed:
+            while not stop_event.is_set():
+                now = time.time()
+                elapsed = now - fight_start
+                
+                # Check if boss is still visible
+                if game_state.has_entity_containing(enemy_keyword):
+                    boss_last_seen = now
+                
+                # Boss gone for threshold seconds → fight over
+                boss_gone_for = now - boss_last_seen
+                if boss_gone_for >= self.boss_gone_threshold:
+                    print(f"  Boss not seen for {self.boss_gone_threshold}s — fight over.")
+                    stop_event.set()
+                    break
+                
+                # Hard timeout
+                if elapsed >= self.fight_timeout:
+                    print(f"  Hard timeout ({self.fight_timeout}s) reached — stopping fight.")
+                    stop_event.set()
+                    break
+                
+                changed.wait(timeout=min(self.boss_gone_threshold - boss_gone_for,
+                                         self.fight_timeout - elapsed))
         
-        # Step 4: Stop everything and save recording
-        script_thread.join(timeout=3.0)
-        video_bytes = recorder.stop()
+        # Step 4: Stop recording and start the upload, then wind down the script
+        video_path = recorder.stop() or None
         fight_duration = time.time() - fight_start
         
-        # Save fight video to disk (Gemini Files API needs a file path)
-        video_path = None
-        if video_bytes:
-            safe_keyword = re.sub(r'[^\w]', '_', enemy_keyword)
-            video_path = os.path.join(
-                self.videos_dir,
-                f"{safe_keyword}_attempt_{int(time.time())}.mp4"
-            )
-            with open(video_path, "wb") as f:
-                f.write(video_bytes)
-            print(f"  Fight video saved: {video_path} ({len(video_bytes) // 1024}KB)")
+        upload_future = None
+        if video_path:
+            print(f"  Fight video saved: {video_path} ({os.path.getsize(video_path) // 1024}KB)")
+            upload_future = self._executor.submit(self._upload_video, video_path)
         
-        return {"video_path": video_path, "duration": fight_duration}
+        # The loop checks stop_event every frame; one still running is stuck inside run().
+        # Only this attempt fails: its recording is still analyzed
+        script_thread.join(timeout=3.0)
+        script_overrun = script_thread.is_alive()
+        if script_overrun:
+            print("  [ERROR] Combat script did not stop within 3s of the fight ending; failing this attempt")
+        for e in script_errors:
+            print(f"  [ERROR] Script loop failed: {e!r}")
+        
+        return {"video_path": video_path, "duration": fight_duration, "upload_future": upload_future,
+                "script_overrun": script_overrun}
+    
+    def _save_script(self, script_path: str, script_code: str):
+        """Write the current script to disk (once per distinct script)."""
+        if self._last_script_saved:
+            return
+        with open(script_path, "w") as f:
+            f.write(script_code)
+        self._last_script_saved = True
+        print(f"[SCRIPT] Saved: {script_path}")
     
     def _wait_for_boss(self, enemy_keyword: str, timeout: float = 120) -> bool:
-        """Poll game_state until the boss entity appears, or timeout."""
-        start = time.time()
-        while time.time() - start < timeout:
-            entities = game_state.get_found_entities()
-            if any(enemy_keyword in name.lower() for name in entities.keys()):
-                return True
-            time.sleep(0.5)
-        return False
+        """Block on game_state.entities_changed until the boss entity appears, or timeout."""
+        changed = game_state.entities_changed
+        with changed:
+            return changed.wait_for(lambda: game_state.has_entity_containing(enemy_keyword), timeout=timeout)
     
     # =========================================================
     # GEMINI HELPERS
     # =========================================================
     
-    def _upload_video(self, video_path: str):
-        """Upload a video to the Gemini Files API and wait for processing."""
-        myfile = self.client.files.upload(file=video_path)
+    def _upload_video(self, video_path: str, reuse: bool = False):
+        """Upload a video to the Gemini Files API and wait for processing.
         
+        With reuse=True the file's content hash is looked up in the on-disk upload
+        cache first, and a still-ACTIVE remote copy is returned without re-uploading.
+        """
+        if reuse:
+            video_hash = _sha256_file(video_path)
+            cache = self._load_upload_cache()
+            entry = cache.get(video_hash)
+            if entry:
+                try:
+                    cached = self.client.files.get(name=entry["name"])
+                    if cached.state.name == "ACTIVE":
+                        print(f"[GEMINI] Reusing uploaded video: {entry['uri']}")
+                        return cached
+                except Exception:
+                    pass  # Expired or deleted remotely; upload again
+        
+        # files.upload already speaks the resumable protocol (8 MB chunks); giving it the
+        # MIME type up front skips type sniffing and sends the file as one upload session
+        myfile = self.client.files.upload(
+            file=video_path,
+            config=types.UploadFileConfig(
+                mime_type="video/mp4",
+                display_name=os.path.basename(video_path),
+            ),
+        )
+        
+        # Poll with exponential backoff: short clips finish well under the old fixed 5s wait
+        delay = 0.25
         while myfile.state.name == "PROCESSING":
-            time.sleep(5)
+            time.sleep(delay)
+            delay = min(delay * 1.7, 5.0)
             myfile = self.client.files.get(name=myfile.name)
         
         if myfile.state.name == "FAILED":
             raise RuntimeError(f"Video upload failed: {myfile.state.name}")
         
+        if reuse:
+            cache[video_hash] = {
+                "name": myfile.name,
+                "uri": myfile.uri,
+                "mtime": os.path.getmtime(video_path),
+            }
+            _write_json_atomic(self._upload_cache_path, cache)
+        
         return myfile
     
+    def _load_upload_cache(self) -> dict:
+        try:
+            with open(self._upload_cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _send_streaming(self, chat, message) -> tuple:
+        """Send `message` on the chat and stream the reply until its script is complete.
+        
+        Returns (text, script) as soon as the reply's ```python block closes: the text
+        received so far (the RESULT line and analysis come first) and the parsed script,
+        or the full text and None if no valid script arrives. The remaining commentary
+        is drained on the executor; the next call waits for it so the chat history
+        holds the whole reply before anything else is sent.
+        """
+        self._finish_stream()
+        
+        stream = iter(chat.send_message_stream(message))
+        parts = []
+        for chunk in stream:
+            text = chunk.text
+            if not text:
+                continue
+            parts.append(text)
+            # Only rescan when a chunk could have closed a code fence
+            if "`" in text:
+                buffer = "".join(parts)
+                match = _PY_BLOCK_RE.search(buffer)
+                if match and "def run(" in match.group(1):
+                    self._stream_tail = self._executor.submit(_drain, stream)
+                    return buffer, match.group(1).strip()
+        
+        text = "".join(parts)
+        return text, self._parse_script(text)
+    
+    def _finish_stream(self):
+        """Wait for the previous streamed reply to finish arriving."""
+        if self._stream_tail is not None:
+            tail, self._stream_tail = self._stream_tail, None
+            tail.result()
+    
     def _parse_script(self, response_text: str) -> str | None:
         """Extract a Python script from Gemini's markdown response.
         
@@ -392,10 +717,10 @@ class CombatLearner:
         Returns the code string, or None if parsing fails.
         """
         # Try to find a python code block
-        match = re.search(r'```python\s*\n(.*?)```', response_text, re.DOTALL)
+        match = _PY_BLOCK_RE.search(response_text)
         if not match:
             # Fallback: try any code block
-            match = re.search(r'```\s*\n(.*?)```', response_text, re.DOTALL)
+            match = _ANY_BLOCK_RE.search(response_text)
         
         if not match:
             print(f"  [PARSE] No code block found in response")
@@ -412,6 +737,10 @@ class CombatLearner:
     
     def _build_system_prompt(self, enemy_name: str, enemy_context: str = "") -> str:
         """Build the system prompt for combat script generation, parameterized by enemy."""
+        key = (enemy_name, enemy_context)
+        prompt = self._prompt_cache.get(key)
+        if prompt is not None:
+            return prompt
         
         context_section = ""
         if enemy_context:
@@ -420,100 +749,24 @@ class CombatLearner:
 {enemy_context}
 """
         
-        return f"""
-You are a game AI script writer. Your task is to write a Python combat script that defeats the {enemy_name} based on video footage you've analyzed.
-
-## GAME STATE
-
-You have access to a `game_state` object with real-time enemy positions:
-- `game_state.get_found_entities()` returns a dict of visible enemies: {{"enemy_name": {{"x": 800, "y": 400, "found": True}}}}
-- The PLAYER is ALWAYS at the CENTER of the screen (x=1280, y=720 on a 2560x1440 display)
-- Enemy coordinates are in screen pixels, updated every frame (~30 FPS)
-
-## HOW ACTIONS WORK (IMPORTANT)
-
-All actions are **non-blocking intent declarations**. Your `run()` function is called every frame.
-You declare what you want to happen THIS frame by calling action methods. After `run()` returns,
-the engine applies everything in a single pass (~5-15ms total). This means:
-
-- You can call AS MANY actions as you want per frame with NO performance penalty
-- Actions do NOT have duration parameters — they apply for exactly one frame
-- To keep moving left, call `actions.move_left()` every frame
-- To stop moving, simply stop calling the method — the key is auto-released next frame
-- Mouse attack is held while you keep calling `attack_at()` — released when you stop
-
-## AVAILABLE ACTIONS
-
-Movement (call each frame you want the key held):
-- actions.move_left()  — Hold left (A key) this frame
-- actions.move_right() — Hold right (D key) this frame
-- actions.fly_up()     — Hold fly/jump (Space key) this frame
-- actions.move_down()  — Hold down (S key) this frame
-
-Dashes (one-shot, queued):
-- actions.dash_left()  — Dash left (double-tap A). One dash per frame max
-- actions.dash_right() — Dash right (double-tap D). One dash per frame max
-
-Combat:
-- actions.attack_at(x, y) — Aim mouse at (x, y) and hold attack this frame
-{context_section}
-## YOUR TASK
-
-Based on the enemy video footage you've seen, write a Python script that defeats the enemy, avoiding being hit while also attacking it.
-
-## SCRIPT FORMAT
-
-Your script must have this structure:
-
-```python
-\"\"\"
-Combat script: {enemy_name}
-Strategy: [Brief description of your approach]
-\"\"\"
-
-# Configuration
-PLAYER_X = 1280  # Player always at screen center
-PLAYER_Y = 720
-
-def run(game_state, actions):
-    '''Called every frame. Declare all actions for this frame.'''
-    enemies = game_state.get_found_entities()
-    # Your combat logic here
-```
-
-## Here's an example script:
-
-```python
-SCREEN_CENTER_X = 1280
-
-def run(game_state, actions):
-    entities = game_state.get_found_entities()
-    if not entities:
-        return
-    for name, entity in entities.items():
-        x, y = entity["x"], entity["y"]
-        if x < SCREEN_CENTER_X:
-            actions.move_right()
-        else:
-            actions.move_left()
-        actions.attack_at(x, y)
-        break
-```
-
-### Keep in mind 
-- All actions are non-blocking. Call multiple actions per frame freely (e.g. move + attack + fly simultaneously)
-- Enemy will not always be on your screen when attacking you, so continue to attack their last known location
-- Enemy's name will always be lower case
-- There is an infinite horizontal platform
-- Constantly holding the movement key in the opposite direction of the enemy is highly advised
-- When the enemy gets too close, dashing into them will make it so you dont take any damage
-"""
+        prompt = _PROMPT_TEMPLATE % {"enemy_name": enemy_name, "context_section": context_section}
+        self._prompt_cache[key] = prompt
+        return prompt
 
 
 # =========================================================
 # CLI ENTRY POINT
 # =========================================================
 
+def _prebuild_tracker():
+    """TrackerService over the existing reference crops, or None if there are none yet."""
+    extraction_dir = os.path.join(os.path.dirname(__file__), "extraction_stuff")
+    try:
+        return create_tracker_from_extraction_dir(extraction_dir=extraction_dir, **_TRACKER_KWARGS)
+    except FileNotFoundError:
+        return None
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Combat Learner - AI that teaches itself to fight game bosses"
@@ -542,18 +795,29 @@ def main():
         "--boss-gone-threshold", type=int, default=15,
         help="Seconds boss must be gone to consider fight over (default: 15)"
     )
+    parser.add_argument(
+        "--keep-scripts", action="store_true",
+        help="Save every attempt's script, not only the winning/final one"
+    )
     
     args = parser.parse_args()
     
-    learner = CombatLearner()
+    # Overlap the Gemini client handshake with building the tracker
+    with ThreadPoolExecutor(max_workers=2) as warmup:
+        client_future = warmup.submit(genai.Client)
+        tracker_future = warmup.submit(_prebuild_tracker)
+        learner = CombatLearner(client=client_future.result())
+        tracker = tracker_future.result()
     learner.fight_timeout = args.fight_timeout
     learner.boss_gone_threshold = args.boss_gone_threshold
+    learner.keep_losing_scripts = args.keep_scripts
     
     result = learner.learn_to_fight(
         enemy_name=args.enemy,
         enemy_video_path=args.video,
         max_attempts=args.max_attempts,
         enemy_context=args.context,
+        tracker=tracker,
     )
     
     # Print final summary
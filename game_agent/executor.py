@@ -10,11 +10,63 @@ from google import genai
 from google.genai import types
 import json
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
 import pydirectinput
 
+from _sendinput import make_batch
 from screen_recorder import ScreenRecorder
-from screenshot import capture_screenshot
+from screenshot import SCREENSHOT_MIME, capture_screenshot
+
+
+# A turn's screenshot is only uploaded if more than this fraction of its 1/8-scale
+# grayscale pixels differ (by more than _PIXEL_DELTA levels) from the last one sent
+_UNCHANGED_FRACTION = 0.02
+_PIXEL_DELTA = 12
+
+# The executor model ends a subtask with one of these markers
+_DONE_MARK = "STATUS: DONE"
+_STATUS_RE = re.compile(r"STATUS: (DONE|STUCK)")
+
+# Executor system instruction; the subtask is sent in the chat's first message
+_EXECUTOR_INSTRUCTION = """You are a game-playing AI executor. Your current subtask and its success
+criteria are given in the first message.
+
+You have access to tools for controlling the game. Gemini will automatically execute your tool calls.
+After each tool call, you'll receive the result.
+You may request several tools in the same turn when the actions are independent
+(e.g. hold_key('d', 2.0) and tap_key('space', 3)); they run in the order given.
+hold_key and hold_click return as soon as the input is pressed and release it in
+the background, so a following tool runs during the hold. Use wait() to let a
+hold finish before the next action.
+
+IMPORTANT: You MUST call at least one tool before saying you're done.
+
+When you believe you've completed the subtask or cannot proceed:
+- If DONE: respond with exactly "STATUS: DONE" followed by a brief description
+- If STUCK: respond with exactly "STATUS: STUCK" followed by what's blocking you
+- If still working: call the next tool(s)
+
+Be methodical. Don't rush."""
+
+# How long tap_key/click keep a key or button down, so the game sees the press
+_TAP_HOLD = 0.05
+
+
+def _screen_luma(image_bytes: bytes):
+    """1/8-scale grayscale plane of an encoded screenshot (JPEG decodes at reduced size directly)."""
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+
+def _screen_changed(luma, reference) -> bool:
+    """Whether `luma` differs enough from `reference` to be worth sending again."""
+    if reference is None or luma is None or luma.shape != reference.shape:
+        return True
+    changed = np.count_nonzero(cv2.absdiff(luma, reference) > _PIXEL_DELTA)
+    return changed >= _UNCHANGED_FRACTION * luma.size
 
 
 class Executor:
@@ -37,8 +89,23 @@ class Executor:
             self.client = genai.Client()  # Uses env var
         
         self.model = model
-        self.recorder = ScreenRecorder(fps=10)
+        self.recorder = ScreenRecorder(fps=10, max_height=720)
+        # Single worker that grabs the next turn's screenshot while the main
+        # thread is busy encoding the current turn's video.
+        self._capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="executor-capture")
         self.tool_registry = {}  # name -> function reference
+        # tuple of requested tool names -> resolved function list / chat config;
+        # both cleared by register_tool
+        self._tool_cfg_cache = {}
+        self._chat_configs = {}
+        # Input held by hold_key/hold_click is released on a timer so the next
+        # tool call in the turn can run meanwhile. input id -> release Event
+        self._held_inputs = {}
+        self._held_lock = threading.Lock()
+        # Tool input goes through one SendInput call per transition on Windows
+        # (pydirectinput elsewhere); the batch is shared with hold release timers
+        self._input = make_batch()
+        self._input_lock = threading.Lock()
         self.max_attempts = 5
         
         # Base tools that are always available
@@ -50,6 +117,10 @@ class Executor:
         def hold_key(key: str, duration: float) -> dict:
             """Hold a key for a duration.
             
+            Returns immediately; the key is released in the background, so the
+            next tool call overlaps with the hold. Holding the same key again
+            waits for the earlier hold to finish first.
+            
             Args:
                 key: Key to hold (e.g., 'w', 'a', 's', 'd', 'space')
                 duration: Seconds to hold
@@ -58,9 +129,8 @@ class Executor:
                 Status dictionary.
             """
             try:
-                pydirectinput.keyDown(key)
-                time.sleep(duration)
-                pydirectinput.keyUp(key)
+                self._hold_input(f"key:{key}", lambda: self._emit("key_down", key),
+                                 lambda: self._emit("key_up", key), duration)
                 return {"status": "success", "key": key, "duration": duration}
             except Exception as e:
                 return {"status": "error", "error": str(e)}
@@ -77,7 +147,9 @@ class Executor:
             """
             try:
                 for _ in range(times):
-                    pydirectinput.press(key)
+                    self._emit("key_down", key)
+                    time.sleep(_TAP_HOLD)
+                    self._emit("key_up", key)
                     time.sleep(0.1)
                 return {"status": "success", "key": key, "times": times}
             except Exception as e:
@@ -105,7 +177,9 @@ class Executor:
                 Status dictionary.
             """
             try:
-                pydirectinput.click(button=button)
+                self._emit("mouse_down", button=button)
+                time.sleep(_TAP_HOLD)
+                self._emit("mouse_up", button=button)
                 return {"status": "success", "button": button}
             except Exception as e:
                 return {"status": "error", "error": str(e)}
@@ -113,6 +187,9 @@ class Executor:
         def hold_click(button: str = "left", duration: float = 1.0) -> dict:
             """Hold mouse button for a duration (for mining, attacking).
             
+            Returns immediately and releases the button in the background,
+            like hold_key.
+            
             Args:
                 button: Which button to hold ('left' or 'right')
                 duration: Seconds to hold
@@ -121,9 +198,8 @@ class Executor:
                 Status dictionary.
             """
             try:
-                pydirectinput.mouseDown(button=button)
-                time.sleep(duration)
-                pydirectinput.mouseUp(button=button)
+                self._hold_input(f"mouse:{button}", lambda: self._emit("mouse_down", button=button),
+                                 lambda: self._emit("mouse_up", button=button), duration)
                 return {"status": "success", "button": button, "duration": duration}
             except Exception as e:
                 pydirectinput.mouseUp(button=button)  # Safety release
@@ -142,9 +218,9 @@ class Executor:
             """
             try:
                 if relative:
-                    pydirectinput.move(x, y)
+                    self._emit("move_by", x, y)
                 else:
-                    pydirectinput.moveTo(x, y)
+                    self._emit("move_to", x, y)
                 return {"status": "success", "x": x, "y": y, "relative": relative}
             except Exception as e:
                 return {"status": "error", "error": str(e)}
@@ -156,9 +232,56 @@ class Executor:
         self.tool_registry["hold_click"] = hold_click
         self.tool_registry["move_mouse"] = move_mouse
     
+    def _emit(self, event: str, *args, **kwargs):
+        """Queue one input event on the shared batch and submit it immediately."""
+        with self._input_lock:
+            getattr(self._input, event)(*args, **kwargs)
+            self._input.send()
+    
+    def _hold_input(self, input_id: str, press, release, duration: float):
+        """Press an input now and release it after `duration` on a timer thread.
+        
+        A second hold of the same input waits for the first to be released, so
+        calls that depend on each other still run in order.
+        """
+        with self._held_lock:
+            previous = self._held_inputs.get(input_id)
+        if previous is not None:
+            previous.wait()
+        
+        released = threading.Event()
+        
+        def _release():
+            try:
+                release()
+            finally:
+                with self._held_lock:
+                    if self._held_inputs.get(input_id) is released:
+                        del self._held_inputs[input_id]
+                released.set()
+        
+        press()
+        with self._held_lock:
+            self._held_inputs[input_id] = released
+        timer = threading.Timer(max(0.0, duration), _release)
+        timer.daemon = True
+        timer.start()
+    
+    def wait_for_held_inputs(self):
+        """Block until every background hold from hold_key/hold_click is released."""
+        while True:
+            with self._held_lock:
+                pending = list(self._held_inputs.values())
+            if not pending:
+                return
+            for released in pending:
+                released.wait()
+    
     def register_tool(self, name: str, func):
         """Register a new tool function."""
         self.tool_registry[name] = func
+        self._tool_cfg_cache.clear()
+        self._chat_configs.clear()
     
     def get_tools_config(self, tool_names: list = None) -> list:
         """Get tool functions for Gemini config.
@@ -169,9 +292,29 @@ class Executor:
         Returns:
             List of function references for Gemini tools config.
         """
-        if tool_names is None:
-            return list(self.tool_registry.values())
-        return [self.tool_registry[name] for name in tool_names if name in self.tool_registry]
+        key = None if tool_names is None else tuple(tool_names)
+        tools = self._tool_cfg_cache.get(key)
+        if tools is None:
+            if key is None:
+                tools = list(self.tool_registry.values())
+            else:
+                tools = [self.tool_registry[name] for name in key if name in self.tool_registry]
+            self._tool_cfg_cache[key] = tools
+        # Callers get their own list; the cached one is never handed out
+        return list(tools)
+    
+    def _chat_config(self, tool_names: list):
+        """GenerateContentConfig for an executor chat with these tools (built once per tool set)."""
+        key = tuple(tool_names)
+        config = self._chat_configs.get(key)
+        if config is None:
+            config = types.GenerateContentConfig(
+                # Get tool functions - Gemini will auto-execute these!
+                tools=self.get_tools_config(tool_names),
+                system_instruction=_EXECUTOR_INSTRUCTION
+            )
+            self._chat_configs[key] = config
+        return config
     
     def attempt_subtask(self, subtask: dict, tools: list = None) -> dict:
         """
@@ -188,91 +331,101 @@ class Executor:
         success_criteria = subtask.get("success_criteria", "Task appears complete")
         tool_names = tools or subtask.get("tools_needed", list(self.tool_registry.keys()))
         
-        # Get tool functions - Gemini will auto-execute these!
-        tool_funcs = self.get_tools_config(tool_names)
-        
-        config = types.GenerateContentConfig(
-            tools=tool_funcs,
-            system_instruction=f"""You are a game-playing AI executor. Your current subtask is:
-
-{description}
-
-Success Criteria: {success_criteria}
-
-You have access to tools for controlling the game. Gemini will automatically execute your tool calls.
-After each tool call, you'll receive the result.
-
-IMPORTANT: You MUST call at least one tool before saying you're done.
-
-When you believe you've completed the subtask or cannot proceed:
-- If DONE: respond with exactly "STATUS: DONE" followed by a brief description
-- If STUCK: respond with exactly "STATUS: STUCK" followed by what's blocking you
-- If still working: call the next tool
-
-Be methodical. Don't rush."""
-        )
+        # Same system instruction and config for every subtask using these tools, so
+        # the request prefix is identical across chats and Gemini can cache it; the
+        # subtask itself goes in the first message instead
+        config = self._chat_config(tool_names)
+        briefing = f"Your current subtask is:\n\n{description}\n\nSuccess Criteria: {success_criteria}\n\n"
         
         chat = self.client.chats.create(model=self.model, config=config)
         
-        all_videos = []
+        # Each turn's clip stays unencoded in the recorder; only the last one that
+        # stopped successfully is handed back, and encoded (see _finish)
+        clip_ready = False
         attempt = 0
         
         print(f"\n[EXECUTOR DEBUG] Starting subtask: {description[:50]}...")
         print(f"[EXECUTOR DEBUG] Success criteria: {success_criteria[:50]}...")
         print(f"[EXECUTOR DEBUG] Available tools: {tool_names}")
         
+        next_screenshot = None
+        # Thumbnail of the last screenshot the model actually received in this chat
+        sent_luma = None
+        
         while attempt < self.max_attempts:
             attempt += 1
             print(f"\n[EXECUTOR DEBUG] ━━━ Attempt {attempt}/{self.max_attempts} ━━━")
             
-            # Get current screenshot
-            print("[EXECUTOR DEBUG] Capturing screenshot...")
-            screenshot_bytes = capture_screenshot()
+            # Get current screenshot (already captured in the background while
+            # the previous turn's recording was being stopped)
+            if next_screenshot is None:
+                print("[EXECUTOR DEBUG] Capturing screenshot...")
+                screenshot_bytes = capture_screenshot()
+            else:
+                screenshot_bytes = next_screenshot.result()
+                next_screenshot = None
             print(f"[EXECUTOR DEBUG] Screenshot captured: {len(screenshot_bytes)//1024}KB")
             
             # Start recording BEFORE sending message (tools may auto-execute)
             print("[EXECUTOR DEBUG] Starting video recording...")
             self.recorder.start()
             
-            # Send screenshot and ask for next action
+            # Send screenshot and ask for next action; a screen that barely changed
+            # since the last one sent is not uploaded again (the chat still has it)
             # Gemini will auto-execute any tools that get called!
-            message_parts = [
-                types.Part(
-                    inline_data=types.Blob(
-                        data=screenshot_bytes,
-                        mime_type="image/jpeg"
-                    )
-                ),
-                f"Attempt {attempt}/{self.max_attempts}. Current game state shown. Call a tool to make progress."
-            ]
+            luma = _screen_luma(screenshot_bytes)
+            if _screen_changed(luma, sent_luma):
+                message_parts = [
+                    types.Part(
+                        inline_data=types.Blob(
+                            data=screenshot_bytes,
+                            mime_type=SCREENSHOT_MIME
+                        )
+                    ),
+                    f"{briefing}Attempt {attempt}/{self.max_attempts}. Current game state shown. Call a tool to make progress."
+                ]
+            else:
+                print("[EXECUTOR DEBUG] Screen unchanged, not re-sending screenshot")
+                luma = None
+                message_parts = [
+                    f"{briefing}Attempt {attempt}/{self.max_attempts}. The screen looks the same as in the last screenshot. Call a tool to make progress."
+                ]
             
             print("[EXECUTOR DEBUG] Sending screenshot to model (tools will auto-execute)...")
             
             # API call with error handling
             try:
-                response = chat.send_message(message_parts)
+                response_text = self._send_streaming(chat, message_parts)
             except Exception as e:
                 print(f"[EXECUTOR DEBUG] ❌ API Error: {e}")
-                # Stop recording and retry
-                self.recorder.stop()
+                # Drop this turn's recording and retry; the previous turn's clip stays pending
+                self.wait_for_held_inputs()
+                self.recorder.discard()
                 print("[EXECUTOR DEBUG] Retrying after error...")
                 time.sleep(1)  # Brief pause before retry
                 continue
             
-            # Wait for any actions to settle
+            if luma is not None:
+                sent_luma = luma
+            briefing = ""  # The chat has the subtask now
+            
+            # Wait for background holds to release and the actions to settle
+            self.wait_for_held_inputs()
             time.sleep(0.3)
             
-            # Stop recording
-            video_bytes = self.recorder.stop()
-            if video_bytes:
-                all_videos.append(video_bytes)
-                print(f"[EXECUTOR DEBUG] Video recorded: {len(video_bytes)//1024}KB")
+            # One scan for either marker
+            status = _STATUS_RE.search(response_text) if response_text else None
             
-            # Get response text
-            try:
-                response_text = response.text if hasattr(response, 'text') and response.text else ""
-            except Exception:
-                response_text = ""
+            # The game state is final for this turn: if another turn follows, grab its
+            # screenshot concurrently with stopping the recorder
+            if status is None and attempt < self.max_attempts:
+                next_screenshot = self._capture_pool.submit(capture_screenshot)
+            
+            # Stop recording; frames are only encoded if this turn ends the subtask
+            self.recorder.stop(encode=False)
+            if self.recorder.get_frame_count() > 0:
+                clip_ready = True
+                print(f"[EXECUTOR DEBUG] Video recorded: {self.recorder.get_frame_count()} frames")
             
             print(f"[EXECUTOR DEBUG] Response: {response_text[:150] if response_text else '(empty)'}...")
             
@@ -281,33 +434,76 @@ Be methodical. Don't rush."""
                 print("[EXECUTOR DEBUG] ⚠️ Empty response, continuing...")
                 continue
             
-            if "STATUS: DONE" in response_text:
+            if status is None:
+                continue
+            if status.group(1) == "DONE":
                 print("[EXECUTOR DEBUG] ✅ STATUS: DONE detected")
-                return {
-                    "status": "done",
-                    "message": response_text,
-                    "attempts": attempt,
-                    "videos": all_videos,
-                    "final_video": all_videos[-1] if all_videos else None
-                }
-            elif "STATUS: STUCK" in response_text:
-                print("[EXECUTOR DEBUG] ❌ STATUS: STUCK detected")
-                return {
-                    "status": "stuck",
-                    "message": response_text,
-                    "attempts": attempt,
-                    "videos": all_videos,
-                    "final_video": all_videos[-1] if all_videos else None
-                }
+                return self._finish("done", response_text, attempt, clip_ready)
+            print("[EXECUTOR DEBUG] ❌ STATUS: STUCK detected")
+            return self._finish("stuck", response_text, attempt, clip_ready)
         
         # Max attempts reached
         print(f"[EXECUTOR DEBUG] ⚠️ Max attempts ({self.max_attempts}) reached")
+        return self._finish("max_attempts", f"Reached {self.max_attempts} attempts without completion",
+                            attempt, clip_ready)
+    
+    def _send_streaming(self, chat, message_parts) -> str:
+        """Send a turn with streaming and return the reply text.
+        
+        Tool calls are executed by the SDK as their chunks arrive. Once the reply
+        reports "STATUS: DONE" the stream is closed at the end of that line: the
+        subtask is over, so the rest of the reply (and its chat history entry) is
+        never needed. Other replies are read to the end so the chat stays complete.
+        """
+        stream = chat.send_message_stream(message_parts)
+        parts = []
+        # Each chunk is scanned once: only the chunk plus the few characters before
+        # it that could start a marker split across chunks, never the whole buffer
+        carry = ""
+        done = False
+        try:
+            for chunk in stream:
+                try:
+                    text = chunk.text
+                except Exception:
+                    text = None
+                if not text:
+                    continue
+                parts.append(text)
+                if done:
+                    if "\n" in text:
+                        break
+                    continue
+                window = carry + text
+                done_at = window.find(_DONE_MARK)
+                if done_at < 0:
+                    carry = window[-(len(_DONE_MARK) - 1):]
+                    continue
+                done = True
+                if "\n" in window[done_at:]:
+                    break
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return "".join(parts)
+    
+    def _finish(self, status: str, message: str, attempts: int, clip_ready: bool) -> dict:
+        """Build the attempt_subtask result, encoding the last recorded clip only now.
+        
+        That is the clip of the last turn whose send succeeded, even if later turns
+        failed. Earlier turns' clips were never used downstream, so they are no longer
+        encoded at all; "videos" holds just the final one.
+        """
+        final_video = self.recorder.encode_last() if clip_ready else b""
+        if final_video:
+            print(f"[EXECUTOR DEBUG] Final video encoded: {len(final_video)//1024}KB")
         return {
-            "status": "max_attempts",
-            "message": f"Reached {self.max_attempts} attempts without completion",
-            "attempts": attempt,
-            "videos": all_videos,
-            "final_video": all_videos[-1] if all_videos else None
+            "status": status,
+            "message": message,
+            "attempts": attempts,
+            "videos": [final_video] if final_video else [],
+            "final_video": final_video or None
         }
 
 
@@ -324,6 +520,7 @@ if __name__ == "__main__":
     # Simple test - just verify tool execution works
     print("\n--- Testing hold_key directly ---")
     result = executor.tool_registry["hold_key"]("w", 0.5)
+    executor.wait_for_held_inputs()
     print(f"Result: {result}")
     
     print("\n--- Testing tap_key directly ---")
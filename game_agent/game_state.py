@@ -4,44 +4,99 @@ Updated by tracker_service, read by behavior scripts.
 """
 
 import threading
+import time
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, field
 from collections import defaultdict
 
 
 class GameState:
-    """Thread-safe game state that holds entity positions."""
+    """
+    Thread-safe game state that holds entity positions.
+    
+    Every update publishes a new per-entity snapshot dict ({"x", "y", "found",
+    "ts", **extra}) that is never mutated afterwards, so readers never take the
+    lock: they load the current snapshot (or table) and use it as is. A snapshot
+    handed to a script stays one consistent update however the tracker moves on;
+    callers treat it as read-only.
+    
+    Writers (the tracker) serialize on a lock. The entity tables are copy-on-write
+    for structural changes: when an entity appears or its visibility flips, they
+    are replaced with new dicts. A plain position update only swaps the entity's
+    value in the existing tables, a single atomic store per table.
+    
+    entities_changed is a Condition on the writer lock: waiting on it (wait_for,
+    `with entities_changed:`) takes the lock, like any Condition.
+    """
     
     def __init__(self):
         self._lock = threading.RLock()
         self._entities: Dict[str, Dict[str, Any]] = {}
+        # Subset of _entities with found=True, published alongside it
+        self._found_entities: Dict[str, Dict[str, Any]] = {}
         self._player: Dict[str, Any] = {"x": 0, "y": 0}
         self._callbacks = []
+        # Found entities keyed by lowercased name, republished only when that set
+        # changes; entities_changed is notified at the same time
+        self._found_by_lower: Dict[str, Dict[str, Any]] = {}
+        self._lower_names: Dict[str, str] = {}  # entity name -> name.lower()
+        self.entities_changed = threading.Condition(self._lock)
     
     def update_entity(self, name: str, x: int, y: int, found: bool = True, **extra):
         """Update an entity's position (called by tracker)."""
+        snapshot = {"x": x, "y": y, "found": found, "ts": time.monotonic(), **extra}
         with self._lock:
-            self._entities[name] = {
-                "x": x,
-                "y": y,
-                "found": found,
-                **extra
-            }
+            was_found = name in self._found_entities
+            if name in self._entities:
+                self._entities[name] = snapshot
+            else:
+                entities = dict(self._entities)
+                entities[name] = snapshot
+                self._entities = entities
+                self._lower_names[name] = name.lower()
+            
+            if found == was_found:
+                if found:
+                    self._found_entities[name] = snapshot
+                    self._found_by_lower[self._lower_names[name]] = snapshot
+                return
+            
+            # Visibility flipped: republish the found set and wake waiters
+            found_entities = dict(self._found_entities)
+            if found:
+                found_entities[name] = snapshot
+            else:
+                del found_entities[name]
+            self._found_entities = found_entities
+            lower_names = self._lower_names
+            self._found_by_lower = {lower_names[n]: e for n, e in found_entities.items()}
+            self.entities_changed.notify_all()
     
     def get_entity(self, name: str) -> Optional[Dict[str, Any]]:
         """Get an entity's current state."""
-        with self._lock:
-            return self._entities.get(name, None)
+        return self._entities.get(name, None)
     
     def get_all_entities(self) -> Dict[str, Dict[str, Any]]:
         """Get all entities."""
-        with self._lock:
-            return dict(self._entities)
+        return dict(self._entities)
     
     def get_found_entities(self) -> Dict[str, Dict[str, Any]]:
         """Get only entities currently visible on screen."""
-        with self._lock:
-            return {k: v for k, v in self._entities.items() if v.get("found", False)}
+        return dict(self._found_entities)
+    
+    def has_entity_containing(self, keyword: str) -> bool:
+        """True if a visible entity's lowercased name contains `keyword` (lowercase)."""
+        for name in self._found_by_lower:
+            if keyword in name:
+                return True
+        return False
+    
+    def find_entity_by_substring(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """First visible entity whose lowercased name contains `keyword`, without copying the entity table."""
+        for name, entity in self._found_by_lower.items():
+            if keyword in name:
+                return entity
+        return None
     
     def set_player(self, x: int, y: int, **extra):
         """Update player position."""
@@ -50,16 +105,14 @@ class GameState:
     
     def get_player(self) -> Dict[str, Any]:
         """Get player position."""
-        with self._lock:
-            return dict(self._player)
+        return dict(self._player)
     
     def to_dict(self) -> Dict[str, Any]:
         """Export full state as dictionary."""
-        with self._lock:
-            return {
-                "player": dict(self._player),
-                "entities": dict(self._entities)
-            }
+        return {
+            "player": dict(self._player),
+            "entities": dict(self._entities)
+        }
     
     def __repr__(self):
         return f"GameState({self.to_dict()})"
@@ -10,6 +10,49 @@ from google import genai
 from google.genai import types
 import json
 import re
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# Response schemas: plan() and diagnose_failure() ask for JSON output in these
+# shapes, so replies parse directly instead of being dug out of free text
+class SubtaskModel(BaseModel):
+    id: int
+    description: str
+    tools_needed: List[str]
+    success_criteria: str
+    estimated_duration: str
+
+
+class PlanModel(BaseModel):
+    subtasks: List[SubtaskModel]
+
+
+class DiagnosisModel(BaseModel):
+    diagnosis: str
+    root_cause: str
+    suggested_fix: str
+    needs_new_tool: bool
+    new_tool_description: Optional[str] = None
+    retry_with_modifications: Optional[str] = None
+
+
+def _parsed_json(response) -> Optional[dict]:
+    """The structured reply as a dict, or None if it did not match the schema."""
+    parsed = getattr(response, "parsed", None)
+    if isinstance(parsed, BaseModel):
+        return parsed.model_dump()
+    try:
+        data = json.loads(response.text)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# Markdown fence around generated tool code
+_FENCE_OPEN_RE = re.compile(r'^```python\s*')
+_FENCE_CLOSE_RE = re.compile(r'\s*```$')
 
 
 class Orchestrator:
@@ -76,19 +119,74 @@ PLANNING RULES:
 2. Each subtask should have CLEAR visual success criteria
 3. Include verification steps (e.g., "Confirm cave entrance is visible")
 4. If a goal requires searching, include MULTIPLE search attempts in different directions
-5. The final subtask should directly achieve the stated goal"""
+5. The final subtask should directly achieve the stated goal""",
+            "response_mime_type": "application/json",
+            "response_schema": PlanModel,
+        }
+        
+        # System instructions for tool writing and failure diagnosis (built once: identical
+        # prefixes across calls also let Gemini reuse its implicit context cache)
+        self.code_config = {
+            "system_instruction": """You write Python functions for game automation.
+Follow this exact format:
+
+def function_name(param1: type1, param2: type2 = default) -> dict[str, any]:
+    \"\"\"Brief description.
+    
+    Args:
+        param1: Description
+        param2: Description (default: value)
+    
+    Returns:
+        A dictionary with status and result.
+    \"\"\"
+    try:
+        # Implementation
+        return {"status": "success", "result": result}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+Rules:
+- Use pydirectinput for keyboard/mouse (already imported)
+- Use time.sleep() for delays (already imported)
+- Return dict with "status" key
+- Include try-except
+- NO imports in your code"""
+        }
+        
+        self.diagnosis_config = {
+            "system_instruction": """You are analyzing why a game task failed.
+Watch the video carefully and determine:
+1. What went wrong
+2. Why it went wrong  
+3. How to fix it
+
+Respond with JSON:
+{
+    "diagnosis": "What happened",
+    "root_cause": "Why it failed",
+    "suggested_fix": "How to solve it",
+    "needs_new_tool": true/false,
+    "new_tool_description": "Description if new tool needed, else null",
+    "retry_with_modifications": "Modified instructions if should retry, else null"
+}""",
+            "response_mime_type": "application/json",
+            "response_schema": DiagnosisModel,
         }
         
         self.chat = None
     
-    def plan(self, goal: str, game_context: str = None, screenshot: bytes = None) -> dict:
+    def plan(self, goal: str, game_context: str = None, screenshot: bytes = None,
+             screenshot_mime: str = "image/jpeg") -> dict:
         """
         Break a high-level goal into subtasks.
         
         Args:
             goal: The high-level objective (e.g., "Find iron ore in Terraria")
             game_context: Optional context about the game/current state
-            screenshot: Optional screenshot bytes showing current game state
+            screenshot: Optional screenshot image bytes showing current game state
+            screenshot_mime: MIME type of `screenshot` (screenshot.SCREENSHOT_MIME for
+                capture_screenshot output)
         
         Returns:
             Dictionary with subtasks and their requirements.
@@ -107,7 +205,7 @@ PLANNING RULES:
                 types.Part(
                     inline_data=types.Blob(
                         data=screenshot,
-                        mime_type="image/jpeg"
+                        mime_type=screenshot_mime
                     )
                 )
             )
@@ -123,18 +221,11 @@ PLANNING RULES:
         
         response = self.chat.send_message(message_parts)
         
-        # Parse JSON from response
-        try:
-            # Try to extract JSON from the response
-            text = response.text
-            # Find JSON in the response (might be wrapped in markdown)
-            json_match = re.search(r'\{[\s\S]*\}', text)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {"error": "Could not parse plan", "raw": text}
-        except json.JSONDecodeError:
+        # The reply is schema-constrained JSON
+        plan = _parsed_json(response)
+        if plan is None:
             return {"error": "Invalid JSON in response", "raw": response.text}
+        return plan
     
     def request_tool(self, tool_description: str) -> str:
         """
@@ -146,41 +237,13 @@ PLANNING RULES:
         Returns:
             Python code for the tool function.
         """
-        code_config = {
-            "system_instruction": """You write Python functions for game automation.
-Follow this exact format:
-
-def function_name(param1: type1, param2: type2 = default) -> dict[str, any]:
-    \"\"\"Brief description.
-    
-    Args:
-        param1: Description
-        param2: Description (default: value)
-    
-    Returns:
-        A dictionary with status and result.
-    \"\"\"
-    try:
-        # Implementation
-        return {"status": "success", "result": result}
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
-
-Rules:
-- Use pydirectinput for keyboard/mouse (already imported)
-- Use time.sleep() for delays (already imported)
-- Return dict with "status" key
-- Include try-except
-- NO imports in your code"""
-        }
-        
-        chat = self.client.chats.create(model=self.model, config=code_config)
+        chat = self.client.chats.create(model=self.model, config=self.code_config)
         response = chat.send_message(f"Create a tool that: {tool_description}")
         
         # Extract code (remove markdown if present)
         code = response.text
-        code = re.sub(r'^```python\s*', '', code)
-        code = re.sub(r'\s*```$', '', code)
+        code = _FENCE_OPEN_RE.sub('', code)
+        code = _FENCE_CLOSE_RE.sub('', code)
         
         return code.strip()
     
@@ -196,25 +259,7 @@ Rules:
         Returns:
             Dictionary with diagnosis and suggested fixes.
         """
-        diagnosis_config = {
-            "system_instruction": """You are analyzing why a game task failed.
-Watch the video carefully and determine:
-1. What went wrong
-2. Why it went wrong  
-3. How to fix it
-
-Respond with JSON:
-{
-    "diagnosis": "What happened",
-    "root_cause": "Why it failed",
-    "suggested_fix": "How to solve it",
-    "needs_new_tool": true/false,
-    "new_tool_description": "Description if new tool needed, else null",
-    "retry_with_modifications": "Modified instructions if should retry, else null"
-}"""
-        }
-        
-        chat = self.client.chats.create(model=self.model, config=diagnosis_config)
+        chat = self.client.chats.create(model=self.model, config=self.diagnosis_config)
         
         message_parts = [
             types.Part(
@@ -235,13 +280,10 @@ Watch the video and diagnose what went wrong."""
         
         response = chat.send_message(message_parts)
         
-        try:
-            json_match = re.search(r'\{[\s\S]*\}', response.text)
-            if json_match:
-                return json.loads(json_match.group())
-            return {"diagnosis": response.text, "needs_new_tool": False}
-        except json.JSONDecodeError:
+        diagnosis = _parsed_json(response)
+        if diagnosis is None:
             return {"diagnosis": response.text, "needs_new_tool": False}
+        return diagnosis
     
     def google_search(self, query: str) -> str:
         """
@@ -1,102 +1,541 @@
 """
 Screen Recorder Module
 Captures screen video during tool execution for the game agent system.
-Uses mss for fast screenshots and opencv for video encoding.
+Uses DXGI Desktop Duplication (dxcam) on Windows, or mss elsewhere, for
+screenshots, and an ffmpeg hardware H.264 encoder (when ffmpeg is on PATH)
+or opencv for video encoding.
 """
 
 import mss
 import cv2
 import numpy as np
+import shutil
+import subprocess
 import threading
 import time
 import tempfile
 import os
 
+try:
+    import dxcam  # Windows Desktop Duplication capture (optional, faster than mss)
+except ImportError:
+    dxcam = None
+
+
+# OpenCV fallback (no ffmpeg binary): hardware H.264 (NVENC/QSV/VideoToolbox, whichever the
+# OpenCV FFmpeg backend finds), then the original software mp4v
+_WRITER_OPTIONS = (
+    ("avc1", [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]),
+    ("mp4v", None),
+)
+# Index into _WRITER_OPTIONS of the first one that opened; probed once per process
+_writer_choice = None
+
+# Buffered frames are stored in preallocated (N, H, W, 3) blocks of this many frames
+_BLOCK_FRAMES = 32
+
+# ffmpeg encoders in preference order with their low-latency options
+_FFMPEG_ENCODERS = (
+    ("h264_nvenc", ["-preset", "p1", "-tune", "ull", "-delay", "0"]),
+    ("h264_qsv", ["-preset", "veryfast"]),
+    ("h264_videotoolbox", ["-realtime", "1"]),
+    ("libx264", ["-preset", "ultrafast", "-tune", "zerolatency", "-pix_fmt", "yuv420p"]),
+)
+# Options for every encoder: no B-frames and short GOPs so closing the stream is quick
+_FFMPEG_COMMON = ["-bf", "0", "-g", "30"]
+# (ffmpeg path, encoder args) once probed; False if ffmpeg or every encoder is unavailable
+_ffmpeg_choice = None
+
+
+def _probe_ffmpeg():
+    """Find ffmpeg and the first encoder in _FFMPEG_ENCODERS that actually works here."""
+    global _ffmpeg_choice
+    if _ffmpeg_choice is not None:
+        return _ffmpeg_choice
+    _ffmpeg_choice = False
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return _ffmpeg_choice
+    for name, args in _FFMPEG_ENCODERS:
+        # Listed encoders can still fail (no GPU/driver), so encode one test frame
+        try:
+            probe = subprocess.run(
+                [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                 "-i", "color=size=256x256", "-frames:v", "1", "-c:v", name, *args,
+                 "-f", "null", "-"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10,
+            )
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if probe.returncode == 0:
+            _ffmpeg_choice = (ffmpeg, ["-c:v", name, *args, *_FFMPEG_COMMON])
+            print(f"[ScreenRecorder] Encoding with ffmpeg {name}")
+            break
+    return _ffmpeg_choice
+
+
+class _FfmpegWriter:
+    """
+    cv2.VideoWriter look-alike that pipes raw BGR frames into an ffmpeg process.
+    
+    With path=None the MP4 is written fragmented to ffmpeg's stdout (no trailing
+    moov rewrite needed) and collected in memory; getvalue() returns it after release().
+    """
+    
+    def __init__(self, ffmpeg: str, encoder_args: list, path, fps: int, size: tuple):
+        width, height = size
+        if path is None:
+            output = ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov", "pipe:1"]
+        else:
+            output = [path]
+        self._proc = subprocess.Popen(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+             "-r", str(fps), "-i", "-", *encoder_args, *output],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if path is None else subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        # stdout is drained concurrently so ffmpeg never blocks on a full pipe
+        self._chunks = []
+        self._reader = None
+        if path is None:
+            self._reader = threading.Thread(target=self._read_output, daemon=True)
+            self._reader.start()
+    
+    def _read_output(self):
+        read = self._proc.stdout.read1
+        while True:
+            chunk = read(1 << 20)
+            if not chunk:
+                break
+            self._chunks.append(chunk)
+    
+    def isOpened(self) -> bool:
+        return self._proc.poll() is None
+    
+    def write(self, frame: np.ndarray):
+        # Frames are contiguous, so the pipe reads the array's memory directly
+        self._proc.stdin.write(frame.data)
+    
+    def release(self):
+        if self._proc.stdin and not self._proc.stdin.closed:
+            self._proc.stdin.close()
+        if self._reader is not None:
+            self._reader.join()
+        self._proc.wait()
+    
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+def _open_writer(path: str, fps: int, size: tuple):
+    """Open an MP4 writer: ffmpeg with the best working H.264 encoder, else OpenCV."""
+    choice = _probe_ffmpeg()
+    if choice:
+        try:
+            return _FfmpegWriter(choice[0], choice[1], path, fps, size)
+        except OSError as e:
+            print(f"[ScreenRecorder] ffmpeg failed to start ({e}), using OpenCV")
+    
+    global _writer_choice
+    start = _writer_choice or 0
+    for i in range(start, len(_WRITER_OPTIONS)):
+        codec, params = _WRITER_OPTIONS[i]
+        fourcc = cv2.VideoWriter_fourcc(*codec)
+        if params is None:
+            writer = cv2.VideoWriter(path, fourcc, fps, size)
+        else:
+            writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, fourcc, fps, size, params)
+        if writer.isOpened() or i == len(_WRITER_OPTIONS) - 1:
+            _writer_choice = i
+            return writer
+        writer.release()
+
 
 class ScreenRecorder:
     """Records screen to video bytes for sending to Gemini."""
     
-    def __init__(self, fps: int = 10, monitor: int = 1):
+    def __init__(self, fps: int = 10, monitor: int = 1, scale: float = 1.0, max_height: int = None):
         """
         Initialize the screen recorder.
         
         Args:
             fps: Frames per second for recording (default 10, good for Gemini analysis)
             monitor: Monitor number to capture (1 = primary)
+            scale: Resize factor applied to each frame before encoding (e.g. 0.5 turns
+                2560x1440 into 1280x720: 4x fewer pixels to encode and upload)
+            max_height: If set, frames taller than this are scaled down to it (e.g. 720)
+                whatever the monitor resolution; takes precedence over scale
         """
         self.fps = fps
         self.monitor = monitor
-        self.frames = []
+        self.scale = scale
+        self.max_height = max_height
         self.recording = False
         self._thread = None
-        self._sct = None
+        self._sct = None  # Capture thread's mss handle while it is running
+        # The capture thread (and its mss handle) outlives a single recording:
+        # start() arms it, stop() waits until it has finished the current frame
+        self._armed = threading.Event()
+        self._idle = threading.Event()
+        self._closed = False
+        # Buffered frames (only without ffmpeg): contiguous BGR blocks written in place
+        # by cvtColor, reused across recordings; _count frames are valid. Shape is set
+        # by the capture thread.
+        self._frame_shape = None
+        self._blocks = []
+        self._count = 0
+        # True while a recording stopped with encode=False still holds its frames: in
+        # _pipe_video (already encoded) or in _pending_blocks (swapped out of _blocks,
+        # so later recordings never overwrite them)
+        self._pending = False
+        self._pending_blocks = []
+        self._pending_count = 0
+        # With ffmpeg available, frames are piped to the encoder as they are captured
+        # instead of being buffered (memory stays at one frame however long the clip)
+        self._pipe_encode = False
+        self._pipe = None
+        self._pipe_video = None
+        # Scratch frames reused every capture (scaled BGRA before conversion, streamed frame)
+        self._small_bgra = None
+        self._stream_buf = None
+        # Set when recording straight to a file instead of buffering frames
+        self._output_path = None
+        self._writer = None
+        self._written = 0
+        # Set by the capture thread when the encoder fails mid-recording
+        self._failed = False
     
-    def start(self):
-        """Start recording the screen in a background thread."""
+    def start(self, output_path: str = None):
+        """
+        Start recording the screen in a background thread (kept alive between
+        recordings, so later start() calls skip thread and mss setup).
+        
+        Args:
+            output_path: If given, frames are encoded straight into this MP4 as they
+                are captured (nothing is buffered in memory) and stop() returns the path.
+        """
         if self.recording:
             return
         
-        self.frames = []
+        self._count = 0
+        self._output_path = output_path
+        self._writer = None
+        self._written = 0
+        self._failed = False
         self.recording = True
-        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
-        self._thread.start()
+        self._idle.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self._thread.start()
+        self._armed.set()
     
-    def stop(self) -> bytes:
+    def stop(self, encode: bool = True):
         """
-        Stop recording and return the video as bytes.
+        Stop recording and return the video.
+        
+        Args:
+            encode: If False, the clip is left pending (unencoded if buffered) and
+                None is returned; encode_last() turns it into MP4 bytes later, if it
+                is needed. It stays pending across later recordings until another
+                stop(encode=False) with frames replaces it.
         
         Returns:
-            MP4 video bytes ready to send to Gemini.
+            MP4 video bytes ready to send to Gemini, or, when started with an
+            output_path, that path ("" if no frames were captured or the encoder
+            failed).
         """
         self.recording = False
         if self._thread:
-            self._thread.join(timeout=2.0)
+            self._idle.wait(timeout=2.0)
+        
+        if self._failed:
+            self._failed = False
+            self._drop_recording()
+            if self._output_path is not None:
+                return ""
+            return b"" if encode else None
+        
+        if self._output_path is not None:
+            if self._writer is None:
+                return ""
+            self._writer.release()
+            self._writer = None
+            return self._output_path
+        
+        if self._pipe is not None:
+            # Already encoded while recording; just flush the encoder
+            writer, self._pipe = self._pipe, None
+            writer.release()
+            if not encode:
+                if self._count:
+                    self._pipe_video = writer.getvalue()
+                    self._pending = True
+                return None
+            return writer.getvalue()
         
-        if not self.frames:
+        if not encode:
+            if self._count:
+                self._blocks, self._pending_blocks = self._pending_blocks, self._blocks
+                self._pending_count = self._count
+                self._pipe_video = None
+                self._pending = True
+            return None
+        
+        if not self._count:
             return b""
         
-        return self._encode_to_mp4()
+        video_bytes = self._encode_to_mp4(self._blocks, self._count)
+        # Keep one block warm for the next recording, free the rest
+        del self._blocks[1:]
+        return video_bytes
+    
+    def discard(self):
+        """
+        Stop recording and drop its frames. A clip left pending by an earlier
+        stop(encode=False) stays pending.
+        """
+        self.recording = False
+        if self._thread:
+            self._idle.wait(timeout=2.0)
+        self._failed = False
+        self._drop_recording()
+    
+    def _drop_recording(self):
+        """Close the current recording's writers and forget its frames."""
+        for writer in (self._writer, self._pipe):
+            if writer is not None:
+                try:
+                    writer.release()
+                except (OSError, ValueError):
+                    pass
+        self._writer = None
+        self._pipe = None
+        self._count = 0
+        if self._output_path is not None:
+            # Whatever reached the file is a truncated MP4
+            try:
+                os.remove(self._output_path)
+            except OSError:
+                pass
+    
+    def encode_last(self) -> bytes:
+        """
+        Encode the recording last stopped with encode=False.
+        
+        Returns:
+            MP4 video bytes, or b"" if there is no such recording (nothing was
+            captured, or it was already encoded).
+        """
+        if not self._pending:
+            return b""
+        self._pending = False
+        if self._pipe_video is not None:
+            video_bytes, self._pipe_video = self._pipe_video, None
+            return video_bytes
+        video_bytes = self._encode_to_mp4(self._pending_blocks, self._pending_count)
+        del self._pending_blocks[1:]
+        return video_bytes
+    
+    def close(self):
+        """Stop recording (if active) and end the capture thread."""
+        if self.recording:
+            self.stop()
+        self._closed = True
+        self._armed.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
     
     def _capture_loop(self):
-        """Background thread that captures frames at the specified FPS."""
+        """Background thread that captures frames at the specified FPS while armed."""
         frame_interval = 1.0 / self.fps
         
-        with mss.mss() as sct:
-            monitor = sct.monitors[self.monitor]
-            
-            while self.recording:
-                start_time = time.perf_counter()
+        # Created here: both capture handles are bound to the thread that uses them,
+        # and the thread lives as long as the recorder, so each is opened only once.
+        # The mss grab's pixel buffer is only wrapped (np.frombuffer), never copied;
+        # resize/cvtColor read it directly into preallocated frame storage.
+        cam = self._open_dxcam()
+        try:
+            with mss.mss() as sct:
+                self._sct = sct
+                monitor = sct.monitors[self.monitor]
+                native = int(monitor["width"]), int(monitor["height"])
+                scale = self.scale
+                if self.max_height:
+                    scale = min(1.0, self.max_height / native[1])
+                # Rounded down to even sizes: H.264 in yuv420p (libx264 and the hardware
+                # encoders) rejects odd widths/heights, e.g. 1366x768 at 0.5 -> 683x384
+                width = max(2, int(native[0] * scale) & ~1)
+                height = max(2, int(native[1] * scale) & ~1)
+                if (width, height) != native:
+                    self._small_bgra = np.empty((height, width, 4), np.uint8)
+                self._frame_shape = (height, width, 3)
+                self._stream_buf = np.empty(self._frame_shape, np.uint8)
+                self._pipe_encode = bool(_probe_ffmpeg())
+                grab = self._make_grab(cam, sct, monitor)
                 
+                while True:
+                    self._armed.wait()
+                    if self._closed:
+                        break
+                    self._armed.clear()
+                    self._record(grab, frame_interval)
+                    self._idle.set()
+        finally:
+            self._sct = None
+            if cam is not None:
+                cam.release()
+    
+    def _open_dxcam(self):
+        """DXGI Desktop Duplication camera for the recorded monitor, or None to use mss."""
+        if dxcam is None:
+            return None
+        try:
+            # dxcam converts to BGR itself, so frames need no BGRA->BGR pass here
+            return dxcam.create(output_idx=self.monitor - 1, output_color="BGR")
+        except Exception as e:
+            print(f"[ScreenRecorder] dxcam unavailable ({e}), using mss")
+            return None
+    
+    def _make_grab(self, cam, sct, monitor):
+        """Return a function that captures one frame into a BGR destination array."""
+        small_bgra = self._small_bgra
+        dsize = (self._frame_shape[1], self._frame_shape[0])
+        
+        def store(bgr, dst):
+            if small_bgra is None:
+                np.copyto(dst, bgr)
+            else:
+                cv2.resize(bgr, dsize, dst=dst, interpolation=cv2.INTER_AREA)
+        
+        def grab_mss(dst):
+            screenshot = sct.grab(monitor)
+            # Wrap mss's pixel buffer in place instead of copying it with np.array
+            bgra = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+                screenshot.height, screenshot.width, 4)
+            # Downscale first so the colour conversion only touches output pixels,
+            # then convert BGRA to BGR (OpenCV format) straight into the destination
+            if small_bgra is not None:
+                bgra = cv2.resize(bgra, dsize, dst=small_bgra, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=dst)
+        
+        if cam is None:
+            return grab_mss
+        
+        last = [None]
+        
+        def grab_dxcam(dst):
+            # dxcam returns None when the screen has not changed since the last grab
+            frame = cam.grab()
+            if frame is None:
+                frame = last[0]
+                if frame is None:
+                    grab_mss(dst)
+                    return
+            last[0] = frame
+            store(frame, dst)
+        
+        return grab_dxcam
+    
+    def _next_slot(self) -> np.ndarray:
+        """Next free frame in the block storage, adding a block when all are full."""
+        block, i = divmod(self._count, _BLOCK_FRAMES)
+        if block == len(self._blocks):
+            self._blocks.append(np.empty((_BLOCK_FRAMES,) + self._frame_shape, np.uint8))
+        self._count += 1
+        return self._blocks[block][i]
+    
+    @staticmethod
+    def _frames(blocks, count):
+        """Iterate over the first `count` frames buffered in `blocks`."""
+        for n in range(count):
+            block, i = divmod(n, _BLOCK_FRAMES)
+            yield blocks[block][i]
+    
+    def _record(self, grab, frame_interval: float):
+        """Capture frames until stop() clears self.recording."""
+        # Frames are paced against absolute deadlines, so a slow grab or encode
+        # delays only its own frame instead of shifting every later one
+        next_deadline = time.perf_counter()
+        try:
+            while self.recording:
                 # Capture frame
-                screenshot = sct.grab(monitor)
-                frame = np.array(screenshot)
-                # Convert BGRA to BGR (OpenCV format)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                self.frames.append(frame)
+                if self._output_path is None:
+                    if self._pipe_encode:
+                        grab(self._stream_buf)
+                        self._pipe_frame(self._stream_buf)
+                    else:
+                        grab(self._next_slot())
+                else:
+                    grab(self._stream_buf)
+                    self._write_frame(self._stream_buf)
                 
                 # Maintain FPS timing
-                elapsed = time.perf_counter() - start_time
-                sleep_time = frame_interval - elapsed
+                next_deadline += frame_interval
+                sleep_time = next_deadline - time.perf_counter()
                 if sleep_time > 0:
                     time.sleep(sleep_time)
+                elif sleep_time < -frame_interval:
+                    # More than a frame behind: drop the backlog rather than burst to catch up
+                    next_deadline = time.perf_counter()
+        except (OSError, ValueError) as e:
+            # The encoder died (BrokenPipeError once ffmpeg exits): end this recording
+            # without a video rather than letting the error kill the capture thread
+            print(f"[ScreenRecorder] Encoder failed ({e!r}), discarding this recording")
+            self._failed = True
+    
+    def _pipe_frame(self, frame: np.ndarray):
+        """Feed one frame to the in-memory ffmpeg encoder, starting it on the first frame."""
+        if self._pipe is None:
+            choice = _probe_ffmpeg()
+            height, width = frame.shape[:2]
+            try:
+                self._pipe = _FfmpegWriter(choice[0], choice[1], None, self.fps, (width, height))
+            except OSError as e:
+                print(f"[ScreenRecorder] ffmpeg failed to start ({e}), buffering frames instead")
+                self._pipe_encode = False
+                np.copyto(self._next_slot(), frame)
+                return
+        self._pipe.write(frame)
+        self._count += 1
     
-    def _encode_to_mp4(self) -> bytes:
-        """Encode captured frames to MP4 bytes."""
-        if not self.frames:
+    def _write_frame(self, frame: np.ndarray):
+        """Encode one frame into the output file, opening the writer on the first frame."""
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = _open_writer(self._output_path, self.fps, (width, height))
+        self._writer.write(frame)
+        self._written += 1
+    
+    def _encode_to_mp4(self, blocks, count) -> bytes:
+        """Encode the first `count` frames buffered in `blocks` to MP4 bytes."""
+        if not count:
             return b""
         
-        # Get frame dimensions from first frame
-        height, width = self.frames[0].shape[:2]
+        height, width = self._frame_shape[:2]
+        
+        # With ffmpeg the MP4 comes back over a pipe and never touches disk
+        choice = _probe_ffmpeg()
+        if choice:
+            try:
+                writer = _FfmpegWriter(choice[0], choice[1], None, self.fps, (width, height))
+            except OSError:
+                writer = None
+            if writer is not None:
+                for frame in self._frames(blocks, count):
+                    writer.write(frame)
+                writer.release()
+                return writer.getvalue()
         
         # Create temp file for video
         temp_path = os.path.join(tempfile.gettempdir(), f"recording_{time.time()}.mp4")
         
         try:
-            # Use mp4v codec for compatibility
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            writer = cv2.VideoWriter(temp_path, fourcc, self.fps, (width, height))
+            writer = _open_writer(temp_path, self.fps, (width, height))
             
-            for frame in self.frames:
+            for frame in self._frames(blocks, count):
                 writer.write(frame)
             
             writer.release()
@@ -114,7 +553,7 @@ class ScreenRecorder:
     
     def get_frame_count(self) -> int:
         """Return the number of frames captured so far."""
-        return len(self.frames)
+        return self._written if self._output_path is not None else self._count
 
 
 # Quick test
@@ -9,17 +9,26 @@ Usage (CLI):
 """
 
 import argparse
-import importlib.util
 import threading
 import time
 import sys
 import os
+from collections import OrderedDict
+from types import ModuleType
 
 from game_state import game_state
 from actions import actions
 from tracker_service import create_tracker_from_extraction_dir
 
 
+# Compiled script code objects keyed by (source, filename), most recent last
+_CODE_CACHE_SIZE = 16
+_code_cache = OrderedDict()
+
+# Modules loaded from disk keyed by path, as (st_mtime_ns, module)
+_script_cache = {}
+
+
 def load_script(script_name: str):
     """Load a behavior script from the test_scripts directory by name."""
     script_dir = os.path.join(os.path.dirname(__file__), "test_scripts")
@@ -34,7 +43,8 @@ def load_script(script_name: str):
 def load_script_from_path(script_path: str):
     """Load a behavior script from an arbitrary file path.
     
-    Used by combat_learner to hot-reload generated scripts.
+    The module is cached by the file's mtime: loading an unchanged file again returns
+    the same module (globals intact), and only an edited file is re-executed.
     
     Args:
         script_path: Absolute or relative path to a .py file with a run() function.
@@ -42,27 +52,68 @@ def load_script_from_path(script_path: str):
     Returns:
         The loaded module with a run(game_state, actions) function.
     """
-    if not os.path.exists(script_path):
-        raise FileNotFoundError(f"Script not found: {script_path}")
+    try:
+        mtime = os.stat(script_path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Script not found: {script_path}") from None
     
-    # Use a unique module name based on path + timestamp to avoid caching
-    module_name = f"script_{os.path.basename(script_path).replace('.py', '')}_{int(time.time())}"
+    cached = _script_cache.get(script_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
     
-    spec = importlib.util.spec_from_file_location(module_name, script_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    module_name = f"script_{os.path.basename(script_path).replace('.py', '')}"
+    
+    with open(script_path, encoding="utf-8") as f:
+        code = f.read()
+    
+    module = load_script_from_code(code, module_name, script_path)
+    _script_cache[script_path] = (mtime, module)
+    return module
+
+
+def load_script_from_code(code: str, module_name: str, filename: str = None):
+    """Build a behavior script module straight from source, without the import system.
+    
+    Scripts only define run() and never import each other, so a plain compile()+exec()
+    into a fresh module is enough. Compiled code is cached by source, so reloading the
+    same script skips compilation; every call still gets a fresh module (clean globals).
+    
+    Args:
+        code: Python source with a run(game_state, actions) function.
+        module_name: Name for the new module.
+        filename: Path reported in tracebacks (defaults to "<module_name>").
+    
+    Returns:
+        The loaded module with a run(game_state, actions) function.
+    """
+    filename = filename or f"<{module_name}>"
+    key = (code, filename)
+    compiled = _code_cache.get(key)
+    if compiled is None:
+        compiled = compile(code, filename, "exec")
+        _code_cache[key] = compiled
+        if len(_code_cache) > _CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    else:
+        _code_cache.move_to_end(key)
+    
+    # Never registered in sys.modules; drop any stale entry under the same name
+    sys.modules.pop(module_name, None)
+    module = ModuleType(module_name)
+    module.__file__ = filename
+    exec(compiled, module.__dict__)
     
     if not hasattr(module, "run"):
-        raise AttributeError(f"Script {script_path} must have a 'run(game_state, actions)' function")
+        raise AttributeError(f"Script {filename} must have a 'run(game_state, actions)' function")
     
     return module
 
 
 def run_script_loop(script_module, fps: int = 60, verbose: bool = True):
     """Run the script in an infinite loop until Ctrl+C (CLI usage)."""
-    frame_time = 1.0 / fps
+    frame_time_ns = 1_000_000_000 // fps
     frame_count = 0
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     print(f"\n{'='*50}")
     print(f"Running script: {script_module.__name__}")
@@ -71,9 +122,8 @@ def run_script_loop(script_module, fps: int = 60, verbose: bool = True):
     print(f"{'='*50}\n")
     
     try:
+        next_deadline = start_ns + frame_time_ns
         while True:
-            loop_start = time.time()
-            
             # Run the script (sets action intents), then flush inputs
             try:
                 script_module.run(game_state, actions)
@@ -87,17 +137,20 @@ def run_script_loop(script_module, fps: int = 60, verbose: bool = True):
             
             # Log periodically
             if verbose and frame_count % fps == 0:
-                elapsed = time.time() - start_time
+                elapsed = (time.monotonic_ns() - start_ns) / 1e9
                 actual_fps = frame_count / elapsed
                 entities = game_state.get_found_entities()
                 entity_str = ", ".join([f"{k}@({v['x']},{v['y']})" for k, v in entities.items()])
                 print(f"[{elapsed:.1f}s] FPS: {actual_fps:.1f} | Entities: {entity_str or 'none'}")
             
-            # Maintain FPS
-            elapsed = time.time() - loop_start
-            sleep_time = frame_time - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            # Maintain FPS against absolute deadlines so one slow frame doesn't shift the rest
+            sleep_ns = next_deadline - time.monotonic_ns()
+            if sleep_ns > 0:
+                time.sleep(sleep_ns / 1e9)
+            elif sleep_ns < -frame_time_ns:
+                # More than a frame behind: drop the backlog rather than burst to catch up
+                next_deadline = time.monotonic_ns()
+            next_deadline += frame_time_ns
                 
     except KeyboardInterrupt:
         print("\n\nStopped by user")
@@ -120,14 +173,13 @@ def run_script_timed(script_module, stop_event: threading.Event, fps: int = 30,
     Returns:
         Dict with {frame_count, elapsed, actual_fps}.
     """
-    frame_time = 1.0 / fps
+    frame_time_ns = 1_000_000_000 // fps
     frame_count = 0
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
+        next_deadline = start_ns + frame_time_ns
         while not stop_event.is_set():
-            loop_start = time.time()
-            
             # Run the script (sets action intents), then flush inputs
             try:
                 script_module.run(game_state, actions)
@@ -139,22 +191,25 @@ def run_script_timed(script_module, stop_event: threading.Event, fps: int = 30,
             
             # Log periodically
             if verbose and frame_count % fps == 0:
-                elapsed = time.time() - start_time
+                elapsed = (time.monotonic_ns() - start_ns) / 1e9
                 actual_fps = frame_count / elapsed if elapsed > 0 else 0
                 entities = game_state.get_found_entities()
                 entity_str = ", ".join([f"{k}@({v['x']},{v['y']})" for k, v in entities.items()])
                 print(f"  [{elapsed:.1f}s] FPS: {actual_fps:.1f} | Entities: {entity_str or 'none'}")
             
-            # Maintain FPS
-            elapsed = time.time() - loop_start
-            sleep_time = frame_time - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            # Maintain FPS against absolute deadlines so one slow frame doesn't shift the rest
+            sleep_ns = next_deadline - time.monotonic_ns()
+            if sleep_ns > 0:
+                time.sleep(sleep_ns / 1e9)
+            elif sleep_ns < -frame_time_ns:
+                # More than a frame behind: drop the backlog rather than burst to catch up
+                next_deadline = time.monotonic_ns()
+            next_deadline += frame_time_ns
     finally:
         # Always release keys when the loop ends
         actions.release_all()
     
-    elapsed = time.time() - start_time
+    elapsed = (time.monotonic_ns() - start_ns) / 1e9
     return {
         "frame_count": frame_count,
         "elapsed": elapsed,
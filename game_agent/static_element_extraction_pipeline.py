@@ -5,6 +5,8 @@ import json
 import os
 import cv2
 import re
+import shutil
+import subprocess
 import argparse
 from dotenv import load_dotenv
 from PIL import Image
@@ -35,6 +37,25 @@ def convert_to_target_fps(input_path, output_dir, target_fps=15):
         cap.release()
         return input_path, original_fps
     
+    # ffmpeg's fps filter drops frames by timestamp while decoding (hardware decode
+    # where available) and re-encodes only what it keeps
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is not None:
+        cap.release()
+        print(f"Converting to {target_fps} FPS with ffmpeg...")
+        try:
+            subprocess.run(
+                [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-hwaccel", "auto",
+                 "-i", input_path, "-vf", f"fps={target_fps}", "-an",
+                 "-c:v", "libx264", "-preset", "ultrafast", output_path],
+                check=True,
+            )
+            print(f"Saved to: {output_path}")
+            return output_path, target_fps
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"ffmpeg conversion failed ({e}), falling back to OpenCV")
+            cap = cv2.VideoCapture(input_path)
+    
     frame_interval = int(round(original_fps / target_fps))
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(output_path, fourcc, target_fps, (width, height))
@@ -45,12 +66,15 @@ def convert_to_target_fps(input_path, output_dir, target_fps=15):
     print(f"Converting to {target_fps} FPS (keeping every {frame_interval} frames)...")
     
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        # Dropped frames are only grabbed: decoded, but never converted to BGR or copied out
         if frame_count % frame_interval == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
             out.write(frame)
             written_count += 1
+        elif not cap.grab():
+            break
         frame_count += 1
     
     cap.release()
@@ -62,13 +86,11 @@ def convert_to_target_fps(input_path, output_dir, target_fps=15):
     return output_path, target_fps
 
 
-def extract_frame(video_path, timestamp_seconds, output_path, target_fps):
-    """Extract a single frame from video at given timestamp."""
-    cap = cv2.VideoCapture(video_path)
+def extract_frame(cap, timestamp_seconds, output_path, target_fps):
+    """Extract a single frame at given timestamp from an already-open cv2.VideoCapture."""
     frame_number = int(timestamp_seconds * target_fps)
     cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
     ret, frame = cap.read()
-    cap.release()
     if ret:
         cv2.imwrite(output_path, frame)
         print(f"Extracted: {timestamp_seconds}s -> {output_path}")
@@ -223,17 +245,18 @@ def run_pipeline(video_path, enemy_name):
     print(response.text)
     
     # Parse JSON response
-    response_text = response.text.strip()
-    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_text)
-    if json_match:
-        response_text = json_match.group(1).strip()
-    else:
-        json_match = re.search(r'(\{[\s\S]*\})', response_text)
-        if json_match:
-            response_text = json_match.group(1).strip()
+    # Decode the first object after a ```json fence (or anywhere, if unfenced) in one
+    # pass; raw_decode stops at the object's end, so trailing fences/prose are ignored
+    response_text = response.text
+    _, fence, fenced = response_text.partition("```json")
+    if fence:
+        response_text = fenced
+    start = response_text.find("{")
     
     try:
-        result = json.loads(response_text)
+        if start < 0:
+            raise json.JSONDecodeError("No JSON object found", response_text, 0)
+        result, _ = json.JSONDecoder().raw_decode(response_text, start)
     except json.JSONDecodeError:
         print("Failed to parse JSON response.")
         return None
@@ -248,13 +271,19 @@ def run_pipeline(video_path, enemy_name):
     frames_dir = os.path.join(output_dir, "frames")
     os.makedirs(frames_dir, exist_ok=True)
     
+    # One capture for every candidate: opening the file re-parses the container and
+    # re-initializes the decoder
     frame_path = None
-    for i, frame_info in enumerate(result.get("recommended_extraction_frames", [])):
-        ts = frame_info.get("timestamp_seconds")
-        if ts is not None:
-            frame_path = os.path.join(frames_dir, f"frame_{ts}s.png")
-            if extract_frame(video_for_gemini, ts, frame_path, TARGET_FPS):
-                break
+    cap = cv2.VideoCapture(video_for_gemini)
+    try:
+        for i, frame_info in enumerate(result.get("recommended_extraction_frames", [])):
+            ts = frame_info.get("timestamp_seconds")
+            if ts is not None:
+                frame_path = os.path.join(frames_dir, f"frame_{ts}s.png")
+                if extract_frame(cap, ts, frame_path, TARGET_FPS):
+                    break
+    finally:
+        cap.release()
     
     if frame_path is None or not os.path.exists(frame_path):
         print("No frames extracted")
@@ -21,15 +21,11 @@ def run(game_state, actions):
     frame_count += 1
     
     # --- 1. Target Tracking ---
-    entities = game_state.get_found_entities()
-    target_visible = False
-    
-    for name, entity in entities.items():
-        if "empress" in name.lower():
-            last_enemy_x = entity["x"]
-            last_enemy_y = entity["y"]
-            target_visible = True
-            break
+    target = game_state.find_entity_by_substring("empress")
+    target_visible = target is not None
+    if target_visible:
+        last_enemy_x = target["x"]
+        last_enemy_y = target["y"]
             
     # --- 2. Movement Logic ---
     # Strategy: Maintain maximum horizontal distance.
@@ -15,15 +15,8 @@ CRITICAL_DISTANCE = 100 # Distance to trigger panic jumps
 
 def run(game_state, actions):
     '''Called every frame. React to enemy position.'''
-    enemies = game_state.get_found_entities()
-
     # Identify target (King Slime)
-    target = None
-    for name, entity in enemies.items():
-        # Look for the boss, or default to first entity found
-        if "king" in name or "slime" in name:
-            target = entity
-            break
+    target = game_state.find_entity_by_substring("king") or game_state.find_entity_by_substring("slime")
     
     # If no enemies found, do nothing
     if not target:
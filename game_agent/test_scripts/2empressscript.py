@@ -12,6 +12,7 @@ PLAYER_Y = 720
 FLIGHT_CYCLE = 30       # Total frames for one up/down cycle (faster = better dodge for tracking)
 DIRECTION_BUFFER = 150  # Pixels of buffer before switching run direction
 CLICK_RATE = 4          # Click mouse every N frames
+DEBUG = False           # Per-frame trace; printing every frame stalls the run loop
 
 # State variables
 frame_count = 0
@@ -23,19 +24,17 @@ def run(game_state, actions):
     global frame_count, last_enemy_x, last_enemy_y, run_direction
     frame_count += 1
     
-    print(f"\n--- Frame {frame_count} ---")
+    if DEBUG:
+        print(f"\n--- Frame {frame_count} ---")
 
     # --- 1. Target Tracking ---
-    entities = game_state.get_found_entities()
-    empress_found = False
-    for name, entity in entities.items():
-        if "empress" in name.lower():
-            last_enemy_x = entity["x"]
-            last_enemy_y = entity["y"]
-            empress_found = True
+    empress = game_state.find_entity_by_substring("empress")
+    if empress is not None:
+        last_enemy_x = empress["x"]
+        last_enemy_y = empress["y"]
+        if DEBUG:
             print(f"[TRACK] Empress found at ({last_enemy_x}, {last_enemy_y})")
-            break
-    if not empress_found:
+    elif DEBUG:
         print(f"[TRACK] Empress NOT found — using last known pos ({last_enemy_x}, {last_enemy_y})")
 
     # --- 2. Horizontal Movement (Momentum Preserving Kiting) ---
@@ -48,17 +47,19 @@ def run(game_state, actions):
     elif last_enemy_x < PLAYER_X - DIRECTION_BUFFER:
         run_direction = 1  # Enemy is Left, Run Right
     
-    if run_direction != prev_direction:
+    if DEBUG and run_direction != prev_direction:
         print(f"[MOVE] Direction SWITCHED to {'LEFT' if run_direction == -1 else 'RIGHT'}")
 
     if run_direction == -1:
         actions.move_left()
         actions.dash_left() # Dash aggressively to maintain top speed
-        print(f"[MOVE] Running LEFT + Dash LEFT")
+        if DEBUG:
+            print(f"[MOVE] Running LEFT + Dash LEFT")
     else:
         actions.move_right()
         actions.dash_right()
-        print(f"[MOVE] Running RIGHT + Dash RIGHT")
+        if DEBUG:
+            print(f"[MOVE] Running RIGHT + Dash RIGHT")
 
     # --- 3. Vertical Movement (The Micro-Wave) ---
     # Oscillate up and down rapidly. 
@@ -68,9 +69,10 @@ def run(game_state, actions):
     
     if cycle_tick < (FLIGHT_CYCLE // 2):
         actions.fly_up()
-        print(f"[VERT] Flying UP (cycle tick {cycle_tick}/{FLIGHT_CYCLE})")
-    else:
-        # Releasing space allows gravity to drop us quickly
+        if DEBUG:
+            print(f"[VERT] Flying UP (cycle tick {cycle_tick}/{FLIGHT_CYCLE})")
+    elif DEBUG:
+        # Not flying: releasing space lets gravity drop us quickly
         print(f"[VERT] Falling (cycle tick {cycle_tick}/{FLIGHT_CYCLE})")
 
     # --- 4. Combat Logic (Semi-Auto) ---
@@ -78,6 +80,7 @@ def run(game_state, actions):
     # We attack for 1 frame, then wait for (CLICK_RATE-1) frames.
     if frame_count % CLICK_RATE == 0:
         actions.attack_at(last_enemy_x, last_enemy_y)
-        print(f"[COMBAT] ATTACKING at ({last_enemy_x}, {last_enemy_y})")
-    else:
+        if DEBUG:
+            print(f"[COMBAT] ATTACKING at ({last_enemy_x}, {last_enemy_y})")
+    elif DEBUG:
         print(f"[COMBAT] Cooldown ({frame_count % CLICK_RATE}/{CLICK_RATE})")
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""INPUT records InputBatch builds for SendInput."""
+
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pydirectinput  # noqa: F401
+except Exception:
+    # pydirectinput only imports on Windows; InputBatch needs just its scancode table
+    _stub = types.ModuleType("pydirectinput")
+    _stub.KEYBOARD_MAPPING = {"a": 0x1E, "d": 0x20, "space": 0x39,
+                              "up": 0xC8, "left": 0xCB, "right": 0xCD, "down": 0xD0}
+    for _name in ("keyDown", "keyUp", "moveTo", "move", "mouseDown", "mouseUp"):
+        setattr(_stub, _name, lambda *args, **kwargs: None)
+    sys.modules["pydirectinput"] = _stub
+
+import _sendinput
+from _sendinput import (INPUT_KEYBOARD, INPUT_MOUSE, KEYEVENTF_EXTENDEDKEY, KEYEVENTF_KEYUP,
+                        KEYEVENTF_SCANCODE, MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP, InputBatch)
+
+
+class _FakeUser32:
+    def __init__(self):
+        self.sent = []
+
+    def GetSystemMetrics(self, index):
+        return 1920 if index == 0 else 1080
+
+    def SendInput(self, count, buf, size):
+        self.sent.append([(buf[i].type, buf[i].u.ki.wScan, buf[i].u.ki.dwFlags) if buf[i].type == INPUT_KEYBOARD
+                          else (buf[i].type, buf[i].u.mi.dwFlags) for i in range(count)])
+        return count
+
+
+def test_arrow_keys_are_extended():
+    batch = InputBatch(_FakeUser32())
+    for key in ("up", "down", "left", "right"):
+        assert batch._down[key].u.ki.dwFlags == KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY
+        assert batch._up[key].u.ki.dwFlags == KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP
+
+
+def test_other_keys_are_plain_scancodes():
+    batch = InputBatch(_FakeUser32())
+    for key in ("a", "d", "space"):
+        assert batch._down[key].u.ki.dwFlags == KEYEVENTF_SCANCODE
+        assert batch._up[key].u.ki.dwFlags == KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP
+
+
+def test_sent_records_keep_flags():
+    user32 = _FakeUser32()
+    batch = InputBatch(user32)
+    batch.key_down("left")
+    batch.key_up("a")
+    batch.send()
+    scancodes = _sendinput.pydirectinput.KEYBOARD_MAPPING
+    assert user32.sent == [[
+        (INPUT_KEYBOARD, scancodes["left"], KEYEVENTF_SCANCODE | KEYEVENTF_EXTENDEDKEY),
+        (INPUT_KEYBOARD, scancodes["a"], KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP),
+    ]]
+
+
+def test_middle_button():
+    user32 = _FakeUser32()
+    batch = InputBatch(user32)
+    batch.mouse_down("middle")
+    batch.mouse_up("middle")
+    batch.send()
+    assert user32.sent == [[(INPUT_MOUSE, MOUSEEVENTF_MIDDLEDOWN), (INPUT_MOUSE, MOUSEEVENTF_MIDDLEUP)]]
+
+
+def test_unknown_names_are_ignored():
+    user32 = _FakeUser32()
+    batch = InputBatch(user32)
+    batch.key_down("no-such-key")
+    batch.key_up("no-such-key")
+    batch.mouse_down("x1")
+    batch.mouse_up("x1")
+    batch.send()
+    assert user32.sent == []
+    batch.flush_frame(["no-such-key"], ["no-such-key", "a"])
+    assert user32.sent == [[(INPUT_KEYBOARD, _sendinput.pydirectinput.KEYBOARD_MAPPING["a"], KEYEVENTF_SCANCODE)]]